@@ -0,0 +1,103 @@
+# Concurrency stress test of get_channel_stream / close_stream against fake Ceton devices.
+# Throughput should scale with the number of devices, as each device allocates under its own lock.
+#
+#   python benchmarks/bench_allocation.py [--devices 1,2,4] [--tuners 6] [--latency 0.02] [--seconds 5] [--load 0.5]
+#                                         [--poll 1] [--policy lru]
+#
+# --load is the number of clients per tuner, at 1 every tuner is wanted all the time and requests fail
+# whenever they all happen to be starting or stopping. --poll is the status_poll_interval, the background
+# polls run alongside the stream starts.
+#
+# Every tuner of every device is started at once before the load, the run fails if a tuner is ever started
+# to a destination another playing tuner, on any device, sends to.
+
+import argparse
+import logging
+import threading
+import time
+
+import harness
+from fake_ceton import Fake_Ceton
+
+
+def run(device_count, tuners, latency, seconds, load, poll=1, policy="lru"):
+    cetons = [Fake_Ceton(tuners, latency).start() for _ in range(device_count)]
+    origin = harness.origin([ceton.address for ceton in cetons], tuners, status_poll_interval=poll,
+                            allocation_policy=policy)
+    origin.update_ceton_tuner_status()
+
+    # A full house first, every tuner playing at the same time
+    full = [origin.get_channel_stream({"origin_number": str(600 + number)}, {})
+            for number in range(tuners * device_count)]
+    for number, stream_info in enumerate(full):
+        if stream_info["url"]:
+            origin.close_stream(number, {"stream_info": stream_info})
+    origin.update_ceton_tuner_status()
+
+    stop = time.monotonic() + seconds
+    results = {"streams": 0, "failed": 0, "latency": []}
+    lock = threading.Lock()
+
+    def client(number):
+        chandict = {"origin_number": str(700 + number)}
+        while time.monotonic() < stop:
+            start = time.monotonic()
+            stream_info = origin.get_channel_stream(chandict, {})
+            elapsed = time.monotonic() - start
+            with lock:
+                if stream_info["url"]:
+                    results["streams"] += 1
+                    results["latency"].append(elapsed)
+                else:
+                    results["failed"] += 1
+            if stream_info["url"]:
+                origin.close_stream(number, {"stream_info": stream_info})
+
+    client_count = max(1, int(tuners * device_count * load))
+    clients = [threading.Thread(target=client, args=(number,)) for number in range(client_count)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    # Let the background diagnostics running for the last streams finish before the devices go away,
+    # the queued ones are dropped
+    origin.tune_history.pool.shutdown(wait=True, cancel_futures=True)
+    for ceton in cetons:
+        ceton.stop()
+
+    return {
+            "streams_per_s": results["streams"] / seconds,
+            "failed": results["failed"],
+            "shared_destinations": sum(ceton.shared_destinations for ceton in cetons),
+            "p50_ms": harness.percentile(results["latency"], 0.50) * 1000,
+            "p95_ms": harness.percentile(results["latency"], 0.95) * 1000,
+            "p99_ms": harness.percentile(results["latency"], 0.99) * 1000,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", default="1,2,4")
+    parser.add_argument("--tuners", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--load", type=float, default=0.5)
+    parser.add_argument("--poll", type=float, default=1)
+    parser.add_argument("--policy", default="lru")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print("devices  streams/s  failed   p50 ms   p95 ms   p99 ms  shared dest")
+    shared = 0
+    for device_count in [int(count) for count in args.devices.split(",")]:
+        result = run(device_count, args.tuners, args.latency, args.seconds, args.load, args.poll, args.policy)
+        print("%7d  %9.1f  %6d  %7.1f  %7.1f  %7.1f  %11d" % (device_count, result["streams_per_s"], result["failed"],
+                                                             result["p50_ms"], result["p95_ms"], result["p99_ms"],
+                                                             result["shared_destinations"]))
+        shared += result["shared_destinations"]
+    if shared:
+        raise SystemExit("Playing tuners shared a destination")
+
+
+if __name__ == "__main__":
+    main()
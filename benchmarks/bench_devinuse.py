@@ -0,0 +1,96 @@
+# Compare the /proc scan of origin/device_usage.py with one `fuser` subprocess per PCIe tuner.
+#
+#   python benchmarks/bench_devinuse.py [--tuners 6] [--processes 400] [--fds 30] [--rounds 20]
+
+import argparse
+import importlib.util
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+
+plugin_dir = pathlib.Path(__file__).resolve().parent.parent
+
+
+def load_device_usage():
+    spec = importlib.util.spec_from_file_location("device_usage", plugin_dir.joinpath("origin", "device_usage.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Device_Usage
+
+
+def build_fake_proc(root, processes, fds, tuners):
+    # Every process holds a handful of ordinary files, every other tuner is held by some process
+    for pid in range(1, processes + 1):
+        fd_dir = os.path.join(root, str(pid), "fd")
+        os.makedirs(fd_dir)
+        for fd in range(fds):
+            os.symlink("/tmp/fake_%s_%s" % (pid, fd), os.path.join(fd_dir, str(fd)))
+    for tuner in range(0, tuners, 2):
+        os.symlink("/dev/ctn91xx_mpeg0_%s" % tuner, os.path.join(root, str(tuner + 1), "fd", str(fds)))
+
+
+def timed(rounds, func):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tuners", type=int, default=6)
+    parser.add_argument("--processes", type=int, default=400)
+    parser.add_argument("--fds", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    Device_Usage = load_device_usage()
+    tmp_dir = tempfile.mkdtemp(prefix="ceton_bench_")
+    try:
+        proc_root = os.path.join(tmp_dir, "proc")
+        build_fake_proc(proc_root, args.processes, args.fds, args.tuners)
+        devices = ["/dev/ctn91xx_mpeg0_%s" % tuner for tuner in range(args.tuners)]
+
+        usage = Device_Usage(proc_root=proc_root)
+        expected = [tuner % 2 == 0 for tuner in range(args.tuners)]
+        assert [usage.in_use(device, fresh=True) for device in devices] == expected
+
+        def native_scan():
+            # One status scan: the first lookup walks /proc, the rest hit the index
+            usage.in_use(devices[0], fresh=True)
+            for device in devices[1:]:
+                usage.in_use(device)
+
+        native = timed(args.rounds, native_scan)
+
+        # Same comparison fuser gets: the real /proc of this machine
+        real_usage = Device_Usage()
+        real_native = timed(args.rounds, lambda: real_usage.in_use(devices[0], fresh=True))
+
+        # fuser can not be pointed at the fake tree, give it real files to look for instead
+        files = [os.path.join(tmp_dir, "ctn91xx_mpeg0_%s" % tuner) for tuner in range(args.tuners)]
+        held = [open(filename, "w") for filename in files[::2]]
+        for filename in files[1::2]:
+            open(filename, "w").close()
+        if shutil.which("fuser"):
+            fuser = timed(args.rounds, lambda: [usage.fuser(filename) for filename in files])
+        else:
+            fuser = None
+        for handle in held:
+            handle.close()
+
+        print("tuners: %s, fake processes: %s x %s fds" % (args.tuners, args.processes, args.fds))
+        print("native, fake /proc : %8.2f ms per status scan" % (native * 1000))
+        print("native, real /proc : %8.2f ms per status scan" % (real_native * 1000))
+        if fuser is None:
+            print("fuser, real /proc  :      n/a (fuser not installed)")
+        else:
+            print("fuser, real /proc  : %8.2f ms per status scan (%.1fx native)" % (fuser * 1000, fuser / real_native))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
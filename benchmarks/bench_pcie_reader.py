@@ -0,0 +1,102 @@
+# stream/pcie_reader.py on many tuners at once, against FIFOs standing in for /dev/ctn91xx_mpeg0_N,
+# fed at QAM256 rate by a separate process. Reports the rate and stalls of every tuner, the reader CPU,
+# and the resident memory over the run, which should stay flat.
+#
+#   python benchmarks/bench_pcie_reader.py [--tuners 6] [--bitrate 38810000] [--seconds 10]
+
+import argparse
+import multiprocessing
+import os
+import struct
+import tempfile
+import threading
+import time
+
+import harness
+from stream.pcie_reader import PCIe_Reader
+
+
+def write_fifo(path, tuner, bitrate, stop):
+    # 352 packets a block, a multiple of 16 so the continuity counters run on across blocks
+    block = b"".join(struct.pack(">BHB", 0x47, 0x4000 | (0x100 + tuner), 0x10 | packet % 16) + b"\xff" * 184
+                     for packet in range(352))
+    interval = len(block) * 8 / bitrate
+    fd = os.open(path, os.O_WRONLY)
+    next_write = time.monotonic()
+    try:
+        while time.monotonic() < stop:
+            os.write(fd, block)
+            next_write += interval
+            time.sleep(max(0, next_write - time.monotonic()))
+    except BrokenPipeError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def fake_devices(paths, bitrate, stop):
+    writers = [threading.Thread(target=write_fifo, args=(path, tuner, bitrate, stop))
+               for tuner, path in enumerate(paths)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+
+def rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tuners", type=int, default=6)
+    parser.add_argument("--bitrate", type=int, default=38810000)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    fifo_dir = tempfile.mkdtemp(prefix="ceton_bench_pcie_")
+    paths = [os.path.join(fifo_dir, "ctn91xx_mpeg0_%s" % tuner) for tuner in range(args.tuners)]
+    for path in paths:
+        os.mkfifo(path)
+    readers = [PCIe_Reader(path, 1152000, 5) for path in paths]
+    for reader in readers:
+        reader.open()
+
+    stop = time.monotonic() + args.seconds
+    # monotonic is system wide on Linux, the writer process stops at the same moment
+    writer = multiprocessing.Process(target=fake_devices, args=(paths, args.bitrate, stop))
+    writer.start()
+
+    def consume(reader):
+        for chunk in reader.chunks(lambda: time.monotonic() < stop):
+            pass
+
+    threads = [threading.Thread(target=consume, args=(reader,)) for reader in readers]
+    cpu = time.process_time()
+    for thread in threads:
+        thread.start()
+    rss = []
+    while time.monotonic() < stop - 1:
+        time.sleep(1)
+        rss.append(rss_mb())
+    for thread in threads:
+        thread.join()
+    cpu = time.process_time() - cpu
+    writer.join()
+
+    print("tuner  Mbit/s  stalls  resyncs  read size")
+    for tuner, reader in enumerate(readers):
+        stats = reader.stats()
+        print("%5d  %6.1f  %6d  %7d  %9d" % (tuner, stats["bytes"] * 8 / args.seconds / 1000000, stats["stalls"],
+                                             stats["resyncs"], stats["read_size"]))
+        reader.close()
+    print("reader CPU %.1f%% of a core, RSS %.1f MB after 1 s, %.1f MB at most, %.1f MB at the end" %
+          (cpu / args.seconds * 100, rss[0], max(rss), rss[-1]))
+    for path in paths:
+        os.unlink(path)
+    os.rmdir(fifo_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Cost of open Ceton pages against a fake device: every page reloading once a poll interval,
+# as pages_to_refresh did, against every page following /api/ceton/events.
+# Reports the get_var requests the device gets, the server CPU and the bytes sent to the pages.
+#
+#   python benchmarks/bench_status_events.py [--pages 1,10] [--tuners 6] [--interval 1] [--seconds 10]
+
+import argparse
+import logging
+import threading
+import time
+
+import harness
+from fake_ceton import Fake_Ceton
+
+
+def run(mode, pages, tuners, interval, seconds):
+    import flask
+    import jinja2
+    from web.ceton_events import Ceton_Events
+    from web.ceton_html import Ceton_HTML
+    from web.ceton_status import Ceton_Status
+
+    ceton = Fake_Ceton(tuners).start()
+    origin = harness.origin([ceton.address], tuners, status_poll_interval=interval)
+    utils = origin.plugin_utils
+    utils.origin_obj = origin
+    fhdhr = harness.types.SimpleNamespace(config=utils.config)
+    status = Ceton_Status(fhdhr, utils)
+    page = Ceton_HTML(fhdhr, utils, status)
+    events = Ceton_Events(utils, status)
+    # A page notices the end of the run at its next event
+    events.keepalive = interval
+
+    app = flask.Flask("ceton_bench")
+    app.jinja_loader = jinja2.DictLoader({"base.html": "{% block content %}{% endblock %}"})
+    app.add_url_rule("/ceton", "page", page)
+    app.add_url_rule("/api/ceton/events", "events", events)
+
+    stop = time.monotonic() + seconds
+    received = [0] * pages
+
+    def reload_page(number):
+        # Every page built its own status on each reload
+        own_status = Ceton_Status(fhdhr, utils)
+        own_status.idle = 0
+        own_page = Ceton_HTML(fhdhr, utils, own_status)
+        while time.monotonic() < stop:
+            with app.test_request_context("/ceton"):
+                received[number] += len(own_page.get())
+            time.sleep(interval)
+
+    def follow_events(number):
+        client = app.test_client()
+        response = client.get("/ceton")
+        received[number] += len(response.data)
+        revision = response.data.decode().split("revision=")[1].split('"')[0]
+        stream = client.get("/api/ceton/events?revision=%s" % revision, buffered=False)
+        for chunk in stream.response:
+            received[number] += len(chunk)
+            if time.monotonic() >= stop:
+                break
+        stream.close()
+
+    # Something to report: a tuner starts halfway through
+    def start_stream():
+        time.sleep(seconds / 2)
+        origin.get_channel_stream({"origin_number": "105"}, {})
+
+    # Requests made by the status poll of the origin itself are not counted
+    origin.tuner_monitor.interval = 3600
+    requests = ceton.requests
+    cpu = time.process_time()
+    start = time.monotonic()
+    threads = [threading.Thread(target=reload_page if mode == "reload" else follow_events, args=(number,))
+               for number in range(pages)]
+    threads.append(threading.Thread(target=start_stream))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cpu = time.process_time() - cpu
+    requests = ceton.requests - requests
+    elapsed = time.monotonic() - start
+    ceton.stop()
+    return {"requests_per_s": requests / elapsed, "cpu_ms_per_s": cpu / elapsed * 1000,
+            "kb_per_s": sum(received) / elapsed / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", default="1,10")
+    parser.add_argument("--tuners", type=int, default=6)
+    parser.add_argument("--interval", type=float, default=1)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print("mode    pages  device req/s  CPU ms/s    KB/s")
+    for mode in ["reload", "events"]:
+        for pages in [int(pages) for pages in args.pages.split(",")]:
+            result = run(mode, pages, args.tuners, args.interval, args.seconds)
+            print("%-6s  %5d  %12.1f  %8.1f  %6.1f" % (mode, pages, result["requests_per_s"],
+                                                       result["cpu_ms_per_s"], result["kb_per_s"]))
+
+
+if __name__ == "__main__":
+    main()
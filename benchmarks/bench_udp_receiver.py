@@ -0,0 +1,100 @@
+# CPU and memory of stream_method ceton (stream/udp_receiver.py) receiving one network tuner,
+# against a fake Ceton in its own process. With ffmpeg on the PATH, the same stream relayed by
+# `ffmpeg -c copy` is measured too.
+#
+#   python benchmarks/bench_udp_receiver.py [--bitrate 19400000] [--seconds 10] [--rtp]
+
+import argparse
+import resource
+import subprocess
+import shutil
+import socket
+import sys
+import time
+
+import requests
+
+import harness
+from stream.udp_receiver import UDP_Receiver
+
+
+def free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_fake(bitrate):
+    fake = subprocess.Popen([sys.executable, str(harness.plugin_dir.joinpath("benchmarks", "fake_ceton.py")),
+                             "--port", "0", "--tuners", "1", "--bitrate", str(bitrate)],
+                            stdout=subprocess.PIPE, text=True)
+    address = fake.stdout.readline().split()[-1]
+    return fake, address
+
+
+def stream_request(address, port, start, rtp):
+    requests.post("http://%s/stream_request.cgi" % address,
+                  {"instance_id": 0, "dest_ip": "127.0.0.1", "dest_port": port, "protocol": int(rtp), "start": start})
+
+
+def bench_receiver(address, seconds, rtp):
+    port = free_port()
+    receiver = UDP_Receiver(port, 1152000, 8388608, 5)
+    receiver.open()
+    stream_request(address, port, 1, rtp)
+
+    stop = time.monotonic() + seconds
+    cpu = time.process_time()
+    for chunk in receiver.chunks(lambda: time.monotonic() < stop):
+        pass
+    cpu = time.process_time() - cpu
+
+    stream_request(address, port, 0, rtp)
+    receiver.close()
+    return {
+            "mbit_s": receiver.bytes * 8 / seconds / 1000000,
+            "cpu_percent": cpu / seconds * 100,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "cc_errors": receiver.cc_errors,
+            "resyncs": receiver.resyncs,
+            }
+
+
+def bench_ffmpeg(address, seconds, rtp):
+    port = free_port()
+    ffmpeg = subprocess.Popen(["ffmpeg", "-loglevel", "quiet", "-i", "%s://127.0.0.1:%s" % ("rtp" if rtp else "udp", port),
+                               "-c", "copy", "-f", "mpegts", "pipe:1"],
+                              stdout=subprocess.DEVNULL)
+    stream_request(address, port, 1, rtp)
+    time.sleep(seconds)
+    stream_request(address, port, 0, rtp)
+    ffmpeg.terminate()
+    ffmpeg.wait()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {"cpu_percent": (usage.ru_utime + usage.ru_stime) / seconds * 100, "max_rss_mb": usage.ru_maxrss / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bitrate", type=int, default=19400000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rtp", action="store_true")
+    args = parser.parse_args()
+
+    fake, address = start_fake(args.bitrate)
+    try:
+        result = bench_receiver(address, args.seconds, args.rtp)
+        print("stream_method ceton: %.1f Mbit/s, %.1f%% of a core, %.1f MB max RSS, %s continuity errors, %s resyncs" %
+              (result["mbit_s"], result["cpu_percent"], result["max_rss_mb"], result["cc_errors"], result["resyncs"]))
+        if shutil.which("ffmpeg"):
+            result = bench_ffmpeg(address, args.seconds, args.rtp)
+            print("ffmpeg -c copy: %.1f%% of a core, %.1f MB max RSS" % (result["cpu_percent"], result["max_rss_mb"]))
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    main()
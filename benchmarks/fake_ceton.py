@@ -0,0 +1,307 @@
+# A fake Ceton InfiniTV, to drive origin/ without hardware.
+#
+# Emulates get_var, stream_request.cgi, channel_request.cgi and view_channel_map.cgi,
+# with a configurable latency, tuner count and channel map size. Like the real web server,
+# a get_var request shorter than 64 bytes hangs unless it is padded. Errors can be injected,
+# and a started tuner sends a synthetic MPEG-TS stream over UDP to its destination.
+# Starting a tuner to a destination another playing tuner of any fake device already sends to is counted
+# in shared_destinations.
+#
+#   python benchmarks/fake_ceton.py [--port 8080] [--tuners 6] [--channels 500] [--latency 0.02]
+#                                   [--error-rate 0] [--hang-rate 0] [--lock-time 0] [--bitrate 2000000]
+
+import argparse
+import base64
+import random
+import socket
+import struct
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Fake_Ceton():
+
+    # view_channel_map.cgi: 50 channels per html page, an xml page lists the block of 1024 channels
+    # its html page falls in, so xml pages 0 to 20 are the same and page 21 starts at channel 1024
+    html_page_channels = 50
+    xml_page_channels = 1024
+
+    # Shorter get_var requests are never answered, see fetch_ceton_getvar
+    getvar_min_length = 64
+
+    # (ip, port) -> (fake, tuner) of the playing tuners of every fake device in the process
+    destinations = {}
+    destinations_lock = threading.Lock()
+
+    def __init__(self, tuners=6, latency=0.0, host="127.0.0.1", port=0, channels=500,
+                 error_rate=0.0, hang_rate=0.0, hang_time=10.0, lock_time=0.0, bitrate=0, seed=None):
+        self.tuners = tuners
+        self.latency = latency
+        self.channels = [self.make_channel(number) for number in range(channels)]
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_time = hang_time
+        self.lock_time = lock_time
+        self.bitrate = bitrate
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.paths = {}
+        self.errors = 0
+        self.hangs = 0
+        self.transport = ["STOPPED"] * tuners
+        self.channel = ["0"] * tuners
+        self.tuned_at = [0] * tuners
+        self.dest = [(None, 0)] * tuners
+        self.shared_destinations = 0
+        self.protocol = [0] * tuners
+        self.emitters = [None] * tuners
+        self.stopping = threading.Event()
+
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake_ceton", daemon=True)
+
+    @property
+    def address(self):
+        return "%s:%s" % self.server.server_address
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            for tuner in range(self.tuners):
+                self.release_destination(tuner)
+
+    def make_channel(self, index):
+        number = str(100 + index)
+        return {"name": "FAKE%s" % number, "number": number, "eia": "%s.%s" % (2 + index // 8, 1 + index % 8),
+                "sourceid": str(10000 + index)}
+
+    def inject(self):
+        # Returns "error", "hang" or None for a request, at the configured rates
+        with self.lock:
+            draw = self.random.random()
+        if draw < self.error_rate:
+            return "error"
+        if draw < self.error_rate + self.hang_rate:
+            return "hang"
+        return None
+
+    def get_var(self, tuner, section, variable):
+        locked = self.transport[tuner] == "PLAYING" and time.monotonic() - self.tuned_at[tuner] >= self.lock_time
+        values = {
+                  "TransportState": self.transport[tuner],
+                  "Signal_Channel": self.channel[tuner],
+                  "Frequency": str(57000000 + 6000000 * (sum(self.channel[tuner].encode()) % 130)),
+                  "ProgramNumber": str(1 + sum(self.channel[tuner].encode()) % 16),
+                  "CopyProtectionStatus": "0x00",
+                  "Host_Connection": "eth",
+                  "Host_Serial_Number": "FAKE0001",
+                  "Host_Firmware": "fake-1.0",
+                  "Hardware_Revision": "1",
+                  "Temperature": "45.0 C",
+                  "OOB_Status": "Locked",
+                  "Signal_Carrier_Lock": "Locked" if locked else "Unlocked",
+                  "Signal_PCR_Lock": "Locked" if locked else "Unlocked",
+                  "Signal_Level": "-1.2 dBmV",
+                  "Signal_SNR": "36.5 dB",
+                  "BER": "0",
+                  "Modulation": "QAM256",
+                  "Streaming_IP": self.dest[tuner][0] or "0.0.0.0",
+                  "Streaming_Port": str(self.dest[tuner][1]),
+                  }
+        return values.get(variable, "%s.%s" % (section, variable))
+
+    def stream_request(self, form):
+        tuner = int(form["instance_id"])
+        with self.lock:
+            if int(form["start"]):
+                self.transport[tuner] = "PLAYING"
+                self.tuned_at[tuner] = time.monotonic()
+                self.release_destination(tuner)
+                self.dest[tuner] = (form["dest_ip"], int(form["dest_port"]))
+                with self.destinations_lock:
+                    if self.destinations.get(self.dest[tuner], (self, tuner)) != (self, tuner):
+                        self.shared_destinations += 1
+                    self.destinations[self.dest[tuner]] = (self, tuner)
+                self.protocol[tuner] = int(form.get("protocol", 0))
+                if self.bitrate and not self.emitters[tuner]:
+                    self.emitters[tuner] = threading.Thread(target=self.emit, args=(tuner,),
+                                                            name="fake_ceton_ts", daemon=True)
+                    self.emitters[tuner].start()
+            else:
+                self.transport[tuner] = "STOPPED"
+                self.release_destination(tuner)
+                self.dest[tuner] = (None, 0)
+                self.emitters[tuner] = None
+
+    def release_destination(self, tuner):
+        with self.destinations_lock:
+            if self.destinations.get(self.dest[tuner]) == (self, tuner):
+                del self.destinations[self.dest[tuner]]
+
+    def channel_request(self, form):
+        with self.lock:
+            tuner = int(form["instance_id"])
+            self.channel[tuner] = form["channel"]
+            self.tuned_at[tuner] = time.monotonic()
+
+    def emit(self, tuner):
+        # 7 null-payload TS packets per datagram, on a PID per tuner, paced to the bitrate.
+        # Protocol 1 of stream_request.cgi wraps them in RTP.
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        pid = 0x100 + tuner
+        continuity = 0
+        sequence = 0
+        interval = 7 * 188 * 8 / self.bitrate
+        next_send = time.monotonic()
+        try:
+            while not self.stopping.is_set():
+                with self.lock:
+                    if self.emitters[tuner] is not threading.current_thread():
+                        return
+                    dest = self.dest[tuner]
+                    rtp = self.protocol[tuner] == 1
+                datagram = b""
+                if rtp:
+                    datagram = struct.pack(">BBHII", 0x80, 33, sequence, int(time.monotonic() * 90000) & 0xFFFFFFFF,
+                                           tuner)
+                    sequence = (sequence + 1) % 65536
+                for _ in range(7):
+                    datagram += struct.pack(">BHB", 0x47, 0x4000 | pid, 0x10 | continuity) + b"\xff" * 184
+                    continuity = (continuity + 1) % 16
+                try:
+                    sock.sendto(datagram, dest)
+                except OSError:
+                    pass
+                next_send += interval
+                time.sleep(max(0, next_send - time.monotonic()))
+        finally:
+            sock.close()
+
+    def channel_map_count_page(self):
+        return ("<html><body><p>Channels 1 to %s of %s</p></body></html>" %
+                (min(self.html_page_channels, len(self.channels)), len(self.channels)))
+
+    def channel_map_xml_page(self, page):
+        start = page * self.html_page_channels // self.xml_page_channels * self.xml_page_channels
+        xml = "<?xml version=\"1.0\"?><channels>"
+        for channel in self.channels[start:start + self.xml_page_channels]:
+            xml += ("<channel><name>%s</name><number>%s</number><eia>%s</eia><sourceid>%s</sourceid></channel>" %
+                    (base64.b64encode(channel["name"].encode()).decode(), channel["number"], channel["eia"],
+                     channel["sourceid"]))
+        return xml + "</channels>"
+
+    def handler(self):
+        ceton = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, body, status=200, content_type="text/html"):
+                body = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def hang(self):
+                with ceton.lock:
+                    ceton.hangs += 1
+                ceton.stopping.wait(ceton.hang_time)
+                self.close_connection = True
+
+            def begin(self):
+                # Returns the parsed url, or None once the request has been failed on purpose
+                url = urllib.parse.urlsplit(self.path)
+                with ceton.lock:
+                    ceton.requests += 1
+                    ceton.paths[url.path] = ceton.paths.get(url.path, 0) + 1
+                if ceton.latency:
+                    time.sleep(ceton.latency)
+                injected = ceton.inject()
+                if injected == "error":
+                    with ceton.lock:
+                        ceton.errors += 1
+                    self.reply("", 500)
+                    return None
+                if injected == "hang":
+                    self.hang()
+                    return None
+                return url
+
+            def do_GET(self):
+                url = self.begin()
+                if not url:
+                    return
+                query = urllib.parse.parse_qs(url.query)
+                if url.path == "/get_var":
+                    if len("http://%s%s" % (self.headers.get("Host", ""), self.path)) < ceton.getvar_min_length:
+                        return self.hang()
+                    tuner = int(query["i"][0])
+                    if tuner >= ceton.tuners:
+                        return self.reply("", 404)
+                    value = ceton.get_var(tuner, query["s"][0], query["v"][0])
+                    return self.reply('<html><body class="get">%s</body></html>' % value)
+                if url.path == "/view_channel_map.cgi":
+                    page = int(query.get("page", ["1"])[0])
+                    if query.get("xml"):
+                        return self.reply(ceton.channel_map_xml_page(page), content_type="application/xml")
+                    return self.reply(ceton.channel_map_count_page())
+                self.reply("", 404)
+
+            def do_POST(self):
+                url = self.begin()
+                if not url:
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                form = {key: values[0] for key, values in
+                        urllib.parse.parse_qs(self.rfile.read(length).decode()).items()}
+                if url.path == "/stream_request.cgi":
+                    ceton.stream_request(form)
+                    return self.reply("")
+                if url.path == "/channel_request.cgi":
+                    ceton.channel_request(form)
+                    return self.reply("")
+                self.reply("", 404)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--tuners", type=int, default=6)
+    parser.add_argument("--channels", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--lock-time", type=float, default=0.0)
+    parser.add_argument("--bitrate", type=int, default=2000000)
+    args = parser.parse_args()
+
+    ceton = Fake_Ceton(args.tuners, args.latency, args.host, args.port, channels=args.channels,
+                       error_rate=args.error_rate, hang_rate=args.hang_rate, lock_time=args.lock_time,
+                       bitrate=args.bitrate).start()
+    print("Fake Ceton listening on %s" % ceton.address, flush=True)
+    try:
+        ceton.thread.join()
+    except KeyboardInterrupt:
+        ceton.stop()
+
+
+if __name__ == "__main__":
+    main()
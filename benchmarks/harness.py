@@ -0,0 +1,84 @@
+# Builds the origin Plugin_OBJ outside of a running fHDHR, against fake Ceton devices.
+# fHDHR itself (for fHDHR.exceptions) and requests must be importable, run from an fHDHR checkout
+# or put it on PYTHONPATH. Rendering the status page also needs flask.
+
+import json
+import logging
+import pathlib
+import sys
+import tempfile
+import types
+
+import requests
+
+plugin_dir = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(plugin_dir))
+sys.path.insert(0, str(plugin_dir.joinpath("benchmarks")))
+
+
+def ceton_config(devices, tuners, **settings):
+    config = {}
+    for key, setting in json.load(open(plugin_dir.joinpath("ceton_conf.json")))["ceton"].items():
+        config[key] = setting["value"]
+    config.update({
+                   "ceton_ip": list(devices),
+                   "device_tuners": [str(tuners)] * len(devices),
+                   "tuners": str(tuners * len(devices)),
+                   })
+    config.update({key: str(value) for key, value in settings.items()})
+    return config
+
+
+def plugin_utils(devices, tuners, cache_dir=None, **settings):
+    utils = types.SimpleNamespace()
+    utils.config = types.SimpleNamespace(
+        dict={"ceton": ceton_config(devices, tuners, **settings), "fhdhr": {"address": "127.0.0.1"}},
+        internal={"paths": {"cache_dir": cache_dir or tempfile.mkdtemp(prefix="ceton_bench_cache_")}})
+    utils.logger = logging.getLogger("ceton")
+    utils.web = types.SimpleNamespace(session=requests.Session(), exceptions=requests.exceptions)
+    utils.path = str(plugin_dir.joinpath("web"))
+    return utils
+
+
+def origin(devices, tuners, cache_dir=None, ready=True, **settings):
+    # With ready, returns once every device is probed and its tuners are Inactive
+    import origin
+    origin_obj = origin.Plugin_OBJ(plugin_utils(devices, tuners, cache_dir, **settings))
+    # Set by fHDHR on the origin it wraps around Plugin_OBJ
+    origin_obj.name = "Ceton"
+    origin_obj.setup_success = True
+    if ready:
+        wait_ready(origin_obj)
+    return origin_obj
+
+
+def wait_ready(origin_obj):
+    for device_probe in origin_obj.device_probes:
+        device_probe.join()
+    origin_obj.update_ceton_tuner_status()
+
+
+def status_page(origin_obj):
+    # The /ceton page, rendered by a bare flask app with an empty base template.
+    # Returns a function rendering it once.
+    import flask
+    import jinja2
+    from web.ceton_html import Ceton_HTML
+    from web.ceton_status import Ceton_Status
+
+    app = flask.Flask("ceton_bench")
+    app.jinja_loader = jinja2.DictLoader({"base.html": "{% block content %}{% endblock %}"})
+    utils = origin_obj.plugin_utils
+    utils.origin_obj = origin_obj
+    fhdhr = types.SimpleNamespace(config=utils.config)
+    page = Ceton_HTML(fhdhr, utils, Ceton_Status(fhdhr, utils))
+
+    def render():
+        with app.test_request_context("/ceton"):
+            return page.get()
+    return render
+
+
+def percentile(values, fraction):
+    values = sorted(values) or [0]
+    return values[min(len(values) - 1, int(len(values) * fraction))]
@@ -0,0 +1,136 @@
+# End-to-end benchmark suite against fake Ceton devices (see fake_ceton.py):
+# startup, get_channels, the /ceton status page and concurrent stream starts.
+#
+# Every run is appended to benchmarks/results.json under the version in plugin.json,
+# and compared with the last run recorded there.
+#
+#   python benchmarks/run_benchmarks.py [--devices 2] [--tuners 6] [--channels 2000] [--latency 0.02]
+#                                       [--seconds 5] [--load 0.5] [--no-save]
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import tempfile
+import time
+
+import harness
+import bench_allocation
+from fake_ceton import Fake_Ceton
+
+results_file = harness.plugin_dir.joinpath("benchmarks", "results.json")
+
+
+def timed(function, *args, **kwargs):
+    start = time.monotonic()
+    result = function(*args, **kwargs)
+    return (time.monotonic() - start) * 1000, result
+
+
+def bench_startup(devices, tuners, repeat=3):
+    # Until hardware probing and stopping every tuner is done, and Plugin_OBJ construction alone
+    construct_durations = []
+    durations = []
+    for _ in range(repeat):
+        start = time.monotonic()
+        origin = harness.origin(devices, tuners, ready=False, status_poll_interval=3600)
+        construct_durations.append((time.monotonic() - start) * 1000)
+        for device_probe in origin.device_probes:
+            device_probe.join()
+        durations.append((time.monotonic() - start) * 1000)
+    return {"startup_ms": statistics.median(durations), "startup_construct_ms": statistics.median(construct_durations)}
+
+
+def bench_get_channels(devices, tuners):
+    cache_dir = tempfile.mkdtemp(prefix="ceton_bench_cache_")
+    origin = harness.origin(devices, tuners, cache_dir, status_poll_interval=3600)
+    cold, lineup = timed(origin.get_channels)
+    unchanged, _ = timed(origin.get_channels)
+
+    # A restart with the lineup on disk answers from the cache
+    origin = harness.origin(devices, tuners, cache_dir, status_poll_interval=3600)
+    cached, _ = timed(origin.get_channels)
+    return {
+            "channels": len(lineup),
+            "get_channels_cold_ms": cold,
+            "get_channels_unchanged_ms": unchanged,
+            "get_channels_cached_ms": cached,
+            }
+
+
+def bench_status_page(devices, tuners, repeat=20):
+    origin = harness.origin(devices, tuners, status_poll_interval=3600)
+    render = harness.status_page(origin)
+    cold, _ = timed(render)
+    durations = [timed(render)[0] for _ in range(repeat)]
+    return {"status_page_cold_ms": cold, "status_page_ms": statistics.median(durations)}
+
+
+def bench_streams(device_count, tuners, latency, seconds, load):
+    result = bench_allocation.run(device_count, tuners, latency, seconds, load)
+    return {"stream_%s" % key: value for key, value in result.items()}
+
+
+def plugin_version():
+    return json.load(open(harness.plugin_dir.joinpath("plugin.json")))["version"]
+
+
+def load_results():
+    if not results_file.exists():
+        return {}
+    return json.load(open(results_file))
+
+
+def last_run(history):
+    runs = [run for version_runs in history.values() for run in version_runs]
+    return max(runs, key=lambda run: run["date"]) if runs else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--tuners", type=int, default=6)
+    parser.add_argument("--channels", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--load", type=float, default=0.5)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    cetons = [Fake_Ceton(args.tuners, args.latency, channels=args.channels).start() for _ in range(args.devices)]
+    devices = [ceton.address for ceton in cetons]
+
+    results = {}
+    results.update(bench_startup(devices, args.tuners))
+    results.update(bench_get_channels(devices, args.tuners))
+    results.update(bench_status_page(devices, args.tuners))
+    results.update(bench_streams(args.devices, args.tuners, args.latency, args.seconds, args.load))
+    for ceton in cetons:
+        ceton.stop()
+
+    history = load_results()
+    previous = last_run(history)
+    print("%-28s %12s %12s" % ("", "this run", "last run (%s)" % previous["version"] if previous else ""))
+    for key, value in results.items():
+        before = previous["results"].get(key) if previous else None
+        print("%-28s %12.1f %12s" % (key, value, "%.1f" % before if before is not None else ""))
+
+    if not args.no_save:
+        version = plugin_version()
+        history.setdefault(version, []).append({
+                                                "version": version,
+                                                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                                "python": platform.python_version(),
+                                                "settings": {key: value for key, value in vars(args).items() if key != "no_save"},
+                                                "results": {key: round(value, 1) for key, value in results.items()},
+                                                })
+        with open(results_file, "w") as output:
+            json.dump(history, output, indent=2)
+            output.write("\n")
+        print("Saved to %s under %s" % (results_file, version))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,56 @@
-import base64
 import re
-import xmltodict
-import subprocess
+import os
+import time
 import threading
+import concurrent.futures
 
 import fHDHR.exceptions
 
+from .getvar_cache import GetVar_Cache
+from .tuner_monitor import Tuner_Monitor
+from .tuner_allocation import allocation_policies, channel_matches
+from .device_usage import Device_Usage
+from .channel_map import Channel_Map
+from .warm_pool import Warm_Pool
+from .tune_history import Tune_History
+from .metrics import Metrics
+from .tuner_state import Tuner, Tuner_Status, transitions
+from .transport import Device_Transport, Device_Down, Transport_Error
+
 
 class Plugin_OBJ():
 
+    # Seconds a get_var result is considered fresh, None never expires (hardware identity)
+    getvar_ttl = {
+                  "HostConnection": None,
+                  "HostSerial": None,
+                  "HostFirmware": None,
+                  "HostHardware": None,
+                  "Temperature": 30,
+                  "OOBStatus": 30,
+                  "Frequency": 5,
+                  "ProgramNumber": 5,
+                  "CopyProtectionStatus": 5,
+                  "Streaming_IP": 5,
+                  "Streaming_Port": 5,
+    }
+    getvar_default_ttl = 2
+
+    # Queries answered by the device as a whole, cached once per device instead of per tuner
+    getvar_device_queries = ["HostConnection", "HostSerial", "HostFirmware", "HostHardware", "Temperature"]
+
+    # Seconds a device gets to claim a tuner before the next device is tried alongside it
+    allocation_hedge = 0.5
+
+    # get_var connections of each device kept for confirming a tuner before it is handed out
+    confirm_connections = 2
+
+    # Every state of the tuner state machine
+    tuner_statuses = list(transitions)
+
     def __init__(self, plugin_utils):
-        self.lock = threading.Lock()
         self.plugin_utils = plugin_utils
+        self.metrics = Metrics()
 
         if not self.ceton_ip:
             raise fHDHR.exceptions.OriginSetupError("Ceton IP not set.")
@@ -26,36 +65,77 @@ class Plugin_OBJ():
             device_tuners = [device_tuners]
         self.config_dict["device_tuners"] = device_tuners
 
-        self.tunerstatus = {}
+        # get_var traffic is limited per device, the Ceton web server does not cope well with many connections
+        self.getvar_semaphores = {}
+        self.getvar_pools = {}
+        # Allocations confirm tuners on slots of their own, they never queue behind background batches
+        self.confirm_semaphores = {}
+        self.confirm_pools = {}
+        # Tuners are picked under a lock per device only, so several devices hand out tuners in parallel
+        self.device_locks = {}
+        self.allocation_pools = {}
+        # Keep-alive connections to each device: one for each allocation worker, get_var and confirm slot,
+        # and a few for the tune history, the monitor and the probe
+        self.transports = {}
+        for device, tuners in zip(devices, device_tuners):
+            pool_size = int(tuners) + self.getvar_connections + self.confirm_connections + 4
+            self.transports[device] = Device_Transport(device, pool_size,
+                                                       self.http_connect_timeout, self.http_read_timeout,
+                                                       self.http_retries, self.breaker_failures, self.breaker_reset,
+                                                       self.plugin_utils.logger, self.set_device_health)
+            self.device_locks[device] = threading.Lock()
+            self.allocation_pools[device] = concurrent.futures.ThreadPoolExecutor(max_workers=int(tuners),
+                                                                                  thread_name_prefix="ceton_alloc")
+            self.getvar_semaphores[device] = threading.BoundedSemaphore(self.getvar_connections)
+            self.getvar_pools[device] = concurrent.futures.ThreadPoolExecutor(max_workers=self.getvar_connections,
+                                                                              thread_name_prefix="ceton_getvar")
+            self.confirm_semaphores[device] = threading.BoundedSemaphore(self.confirm_connections)
+            self.confirm_pools[device] = concurrent.futures.ThreadPoolExecutor(max_workers=self.confirm_connections,
+                                                                               thread_name_prefix="ceton_confirm")
+
+        self.getvar_cache = GetVar_Cache(self.getvar_cache_size)
+        self.device_usage = Device_Usage()
+
+        if self.allocation_policy not in allocation_policies:
+            raise fHDHR.exceptions.OriginSetupError("Unknown Ceton allocation policy: %s" % self.allocation_policy)
+        self.tuner_allocation = allocation_policies[self.allocation_policy](self)
+
+        # Tuner state by global tuner number, across all devices
+        self.ceton_tuners = []
+        self.device_instances = []
+
+        # Hardware type (HostConnection) of each device, once it has answered
+        self.hwtypes = {}
+        self.device_probes = []
+
+        # Network tuners stream to a UDP port of their own, numbered by the global tuner number across all devices
+        port = 49990
+        for device_index, (device, tuners) in enumerate(zip(devices, device_tuners)):
+            instances = []
+            for i in range(int(tuners)):
+                instance = len(self.ceton_tuners)
+                self.ceton_tuners.append(Tuner(instance, device, device_index, i, port + instance,
+                                               self.transports[device].health))
+                if i == 0:
+                    self.device_instances.append(instance)
+                instances.append(instance)
+            self.device_probes.append(threading.Thread(target=self.probe_device, args=(device, instances),
+                                                       name="ceton_probe", daemon=True))
 
-        tuner_tmp_count = 0
-        device_count = 0
+        self.channel_map = Channel_Map(self, os.path.join(self.plugin_utils.config.internal["paths"]["cache_dir"],
+                                                          "ceton_channel_map.json"))
 
-        for device, tuners in zip(devices, device_tuners):
-            port = 49990
-            count = int(tuners)
-            hwtype = ''
-            for i in range(count):
-                self.tunerstatus[str(tuner_tmp_count)] = {"ceton_ip": device}
-                self.tunerstatus[str(tuner_tmp_count)]['ceton_device'] = str(device_count)
-                self.tunerstatus[str(tuner_tmp_count)]['ceton_tuner'] = str(i)
+        self.tune_history = Tune_History(self, self.tune_history_size)
+        # Readers of the streams served by stream_method ceton, by tuner
+        self.stream_readers = {}
+        self.warm_pool = Warm_Pool(self, self.warm_pool_size, self.warm_pool_channels, self.warm_pool_history)
 
-                if i == 0:
-                    hwtype = self.get_ceton_getvar( tuner_tmp_count, "HostConnection")
-                    self.plugin_utils.logger.info('Ceton hardware type: %s' % hwtype)
-
-                if 'pci' in hwtype:
-                    self.tunerstatus[str(tuner_tmp_count)]['ceton_pcie']  = True
-                    self.tunerstatus[str(tuner_tmp_count)]['port']  = "ctn91xx_mpeg0_%s" % i
-                    self.tunerstatus[str(tuner_tmp_count)]['streamurl'] = "/dev/ctn91xx_mpeg0_%s" % i
-                else:
-                    self.tunerstatus[str(tuner_tmp_count)]['ceton_pcie']  = False
-                    self.tunerstatus[str(tuner_tmp_count)]['port']  = port + i
-                    self.tunerstatus[str(tuner_tmp_count)]['streamurl'] = "udp://127.0.0.1:%s" % (port + i)
-
-                self.startstop_ceton_tuner(tuner_tmp_count, 0)
-                tuner_tmp_count += 1
-            device_count = device_count + 1
+        self.tuner_monitor = Tuner_Monitor(self, self.status_poll_interval)
+        self.tuner_monitor.start()
+
+        # Devices are probed and their tuners reset in the background, a slow or dead device does not hold up fHDHR
+        for device_probe in self.device_probes:
+            device_probe.start()
 
     @property
     def config_dict(self):
@@ -81,7 +161,122 @@ class Plugin_OBJ():
     def pcie_ip(self):
         return self.config_dict["pcie_ip"]
 
-    def get_ceton_getvar(self, instance, query):
+    @property
+    def getvar_connections(self):
+        return int(self.config_dict["getvar_connections"])
+
+    @property
+    def getvar_cache_size(self):
+        return int(self.config_dict["getvar_cache_size"])
+
+    @property
+    def allocation_policy(self):
+        return self.config_dict["allocation_policy"]
+
+    @property
+    def warm_pool_size(self):
+        return int(self.config_dict["warm_pool"])
+
+    @property
+    def warm_pool_channels(self):
+        channels = self.config_dict["warm_pool_channels"]
+        if not isinstance(channels, list):
+            channels = [channel.strip() for channel in str(channels or "").split(",")]
+        return channels
+
+    @property
+    def warm_pool_history(self):
+        return int(self.config_dict["warm_pool_history"])
+
+    @property
+    def tune_history_size(self):
+        return int(self.config_dict["tune_history"])
+
+    @property
+    def device_timeout(self):
+        return float(self.config_dict["device_timeout"])
+
+    @property
+    def status_poll_interval(self):
+        return float(self.config_dict["status_poll_interval"])
+
+    @property
+    def http_connect_timeout(self):
+        return float(self.config_dict["http_connect_timeout"])
+
+    @property
+    def http_read_timeout(self):
+        return float(self.config_dict["http_read_timeout"])
+
+    @property
+    def http_retries(self):
+        return int(self.config_dict["http_retries"])
+
+    @property
+    def breaker_failures(self):
+        return int(self.config_dict["breaker_failures"])
+
+    @property
+    def breaker_reset(self):
+        return float(self.config_dict["breaker_reset"])
+
+    def probe_device(self, device, instances):
+        # Read the hardware type of a device, until it answers, then stop all of its tuners at once.
+        # Its tuners stay Probing until then and are not allocated.
+        hwtype = self.get_ceton_getvar(instances[0], "HostConnection", fresh=True)
+        while hwtype is None:
+            self.plugin_utils.logger.warning('Ceton device %s did not answer, probing again in %s seconds' %
+                                             (device, self.breaker_reset))
+            time.sleep(self.breaker_reset)
+            hwtype = self.get_ceton_getvar(instances[0], "HostConnection", fresh=True)
+        self.hwtypes[device] = hwtype
+        self.plugin_utils.logger.info('Ceton hardware type: %s' % hwtype)
+
+        for instance in instances:
+            if 'pci' in hwtype:
+                tuner = self.ceton_tuners[instance]
+                tuner.ceton_pcie  = True
+                tuner.port  = "ctn91xx_mpeg0_%s" % tuner.tuner
+                tuner.streamurl = "/dev/ctn91xx_mpeg0_%s" % tuner.tuner
+
+        # StopPending once stopped, the next status poll finds them Inactive
+        stopping = [self.allocation_pools[device].submit(self.startstop_ceton_tuner, instance, 0)
+                    for instance in instances]
+        concurrent.futures.wait(stopping)
+        self.plugin_utils.logger.info('Ceton device %s ready, %s tuners' % (device, len(instances)))
+        self.tuner_monitor.poll()
+
+    def hwtype(self, instance):
+        # Hardware type of the device of a tuner, '' while it is being probed
+        return self.hwtypes.get(self.ceton_tuners[instance].device, '')
+
+    def set_device_health(self, device, health):
+        # Called by the transport of a device when its circuit breaker changes state
+        for tuner in self.ceton_tuners:
+            if tuner.device == device:
+                tuner.device_health = health
+
+    def getvar_cache_key(self, instance, query):
+        tuner = self.ceton_tuners[instance]
+        if query in self.getvar_device_queries:
+            return (tuner.device, None, query)
+        return (tuner.device, tuner.tuner, query)
+
+    def get_ceton_getvar(self, instance, query, fresh=False):
+        device = self.ceton_tuners[instance].device
+        cache_key = self.getvar_cache_key(instance, query)
+
+        if fresh:
+            value = self.fetch_ceton_getvar(instance, query)
+            self.getvar_cache.set(cache_key, value)
+            return value
+
+        return self.getvar_cache.get(cache_key, self.getvar_ttl.get(query, self.getvar_default_ttl),
+                                     lambda: self.fetch_ceton_getvar(instance, query),
+                                     self.getvar_pools[device].submit)
+
+    def fetch_ceton_getvar(self, instance, query, slots="getvar"):
+        # slots is "getvar" for the shared get_var slots of the device, "confirm" for those kept for allocations
         query_type = {
                       "Frequency": "&s=tuner&v=Frequency",
                       "ProgramNumber": "&s=mux&v=ProgramNumber",
@@ -104,248 +299,480 @@ class Plugin_OBJ():
                       "Streaming_Port": "&s=diag&v=Streaming_Port",
         }
 
-        getVarUrl = ('http://%s/get_var?i=%s%s' % (self.tunerstatus[str(instance)]['ceton_ip'], self.tunerstatus[str(instance)]['ceton_tuner'], query_type[query]))
+        tuner = self.ceton_tuners[instance]
+        device = tuner.device
+        getVarUrl = ('http://%s/get_var?i=%s%s' % (device, tuner.tuner, query_type[query]))
 
         try:
             #ceton web server hangs if the request is a certain length?!
             #kernel 6.x buffering issue? I have no clue.
             #pad the url to be at least 64 bytes, this seems to fix it.
-            getVarUrlReq = self.plugin_utils.web.session.get(
-                getVarUrl + '&' + '*' * (64-len( getVarUrl)) 
-            )
-            getVarUrlReq.raise_for_status()
-        except self.plugin_utils.web.exceptions.HTTPError as err:
+            semaphores = self.confirm_semaphores if slots == "confirm" else self.getvar_semaphores
+            waiting = time.perf_counter()
+            with semaphores[device]:
+                start = time.perf_counter()
+                self.metrics.observe("ceton_lock_wait_seconds", start - waiting, lock=slots, device=device)
+                try:
+                    getVarUrlReq = self.transports[device].get(
+                        getVarUrl + '&' + '*' * (64-len( getVarUrl))
+                    )
+                finally:
+                    elapsed = time.perf_counter() - start
+            self.metrics.observe("ceton_lock_hold_seconds", elapsed, lock=slots, device=device)
+            self.metrics.observe("ceton_getvar_seconds", elapsed, device=device, query=query)
+        except Device_Down as err:
+            # Logged once by the transport when the device went down
+            self.plugin_utils.logger.debug('Skipped Ceton tuner variable %s: %s' % (query, err))
+            return None
+        except Transport_Error as err:
+            self.metrics.inc("ceton_getvar_errors_total", device=device, query=query)
             self.plugin_utils.logger.error('Error while getting Ceton tuner variable for %s: %s' % (query, err))
             return None
 
         result = re.search('get.>(.*)</body', getVarUrlReq.text)
+        if not result:
+            self.metrics.inc("ceton_getvar_errors_total", device=device, query=query)
+            self.plugin_utils.logger.error('Unexpected answer from Ceton device %s to get_var %s' % (device, query))
+            return None
 
         return result.group(1)
 
-    def devinuse(self, instance):
-        filename = self.tunerstatus[str(instance)]['streamurl']
+    def get_ceton_getvars(self, queries, fresh=False):
+        # Resolve a batch of (instance, query) pairs at once, fanned out on the pool of each device
+        futures = {}
+        for instance, query in set(queries):
+            device = self.ceton_tuners[instance].device
+            future = self.getvar_pools[device].submit(self.get_ceton_getvar, instance, query, fresh)
+            futures[future] = (instance, query)
+
+        results = {}
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+        return results
+
+    def confirm_ceton_getvars(self, instance, queries):
+        # Fresh reads of one tuner for an allocation, sent together on the confirm slots of its device
+        device = self.ceton_tuners[instance].device
+        futures = {query: self.confirm_pools[device].submit(self.fetch_ceton_getvar, instance, query, "confirm")
+                   for query in queries}
+        results = {}
+        for query, future in futures.items():
+            results[query] = future.result()
+            self.getvar_cache.set(self.getvar_cache_key(instance, query), results[query])
+        return results
+
+    def devinuse(self, instance, fresh=False):
+        filename = self.ceton_tuners[instance].streamurl
         if '/dev' in filename:
-            try:
-                subprocess.check_output(['fuser', filename], stderr=subprocess.DEVNULL)
-                # man: if access has been found, fuser returns zero
-                # => Return True, device is in use
-                return True
-            except subprocess.CalledProcessError:
-                # man: fuser returns a non-zero return code if none of the specified files is accessed
-                # => Return False, device is not in use
-                return False
+            return self.device_usage.in_use(filename, fresh)
         else:
             return False
 
+    def update_ceton_tuner_status(self):
+        # Refresh the in-memory tuner snapshot, all network I/O happens before the lock is taken.
+        # Only what the state machine needs is read, signal readings are read through the cache when shown.
+        # Tuners of a device still being probed are left to probe_device
+        tuners = [tuner for tuner in self.ceton_tuners if tuner.status != Tuner_Status.PROBING]
+        # A tuner claimed, started or parked while the reads are out is left to the next poll
+        generations = {tuner.instance: tuner.generation for tuner in tuners}
+        queries = [
+            (tuner.instance, query)
+            for tuner in tuners
+            for query in ["TransportState", "Signal_Channel"]
+        ]
+        # A warm tuner streams to us on purpose, it is only taken over if another client redirects it.
+        # An external one streaming to us is a stream of ours that was lost track of.
+        queries.extend((tuner.instance, query) for tuner in tuners
+                       if tuner.status in [Tuner_Status.WARM, Tuner_Status.EXTERNAL] and not tuner.ceton_pcie
+                       for query in ["Streaming_IP", "Streaming_Port"])
+        getvars = self.get_ceton_getvars(queries, fresh=True)
+        hwinuse = {}
+        for tuner in tuners:
+            hwinuse[tuner.instance] = tuner.ceton_pcie and self.devinuse(tuner.instance)
+
+        address = self.plugin_utils.config.dict["fhdhr"]["address"]
+        stopped = []
+        strays = []
+        for tuner in tuners:
+            instance = tuner.instance
+            with tuner.lock:
+                if tuner.generation != generations[instance]:
+                    continue
+                transport = getvars[(instance, "TransportState")]
+                if transport is None:
+                    # Nothing was read, keep the last known state until the device answers again
+                    continue
+                tuner.channel = getvars[(instance, "Signal_Channel")]
+                if (tuner.status == Tuner_Status.WARM and transport == "STOPPED" and not tuner.ceton_pcie
+                        and not hwinuse[instance]):
+                    # One reading does not let go of a warm tuner, it is read again below
+                    stopped.append(tuner)
+                    continue
+                self.update_tuner_state(instance, transport, hwinuse[instance],
+                                        getvars.get((instance, "Streaming_Port")))
+                if (tuner.status == Tuner_Status.EXTERNAL and transport != "STOPPED"
+                        and getvars.get((instance, "Streaming_IP")) == address
+                        and str(getvars.get((instance, "Streaming_Port"))) == str(tuner.port)):
+                    strays.append((tuner, tuner.generation))
+
+        if stopped:
+            confirms = self.get_ceton_getvars([(tuner.instance, "TransportState") for tuner in stopped], fresh=True)
+            for tuner in stopped:
+                with tuner.lock:
+                    if (tuner.generation == generations[tuner.instance]
+                            and confirms[(tuner.instance, "TransportState")] == "STOPPED"):
+                        self.update_tuner_state(tuner.instance, "STOPPED", False)
+
+        for tuner, generation in strays:
+            # Nobody else would ever stop it, External only clears when its client stops the tuner
+            if tuner.generation == generation:
+                self.plugin_utils.logger.warning('Ceton tuner %s is External but streams to fHDHR, stopping it' %
+                                                 tuner.instance)
+                self.startstop_ceton_tuner(tuner.instance, 0)
+
+    def claim_tuner(self, instance, statuses, status=Tuner_Status.ACTIVE):
+        # Atomically move a tuner from one of statuses to status, returns the status it was claimed from
+        tuner = self.ceton_tuners[instance]
+        with tuner.lock:
+            current = tuner.status
+            if current not in statuses:
+                return None
+            tuner.transition(status)
+            return current
+
+    def update_tuner_state(self, instance, transport, hwinuse, streaming_port=None):
+        # Called with the tuner lock held.
+        # Advance the tuner state machine from a fresh reading, returns True if the tuner is free.
+        # Check to see if transport on (rtp/udp streaming), or direct HW device access (pcie)
+        # This also handles the case of another client accessing the tuner!
+        tuner = self.ceton_tuners[instance]
+        status = tuner.status
+        tuner.transport = transport
+        tuner.hwinuse = hwinuse
+
+        if status in [Tuner_Status.ACTIVE, Tuner_Status.PROBING]:
+            return False
+
+        if status == Tuner_Status.WARM:
+            # Parked by the warm pool, hand it over if an external client opened the device or took the transport
+            if hwinuse or (streaming_port is not None and str(streaming_port) != str(tuner.port)):
+                self.plugin_utils.logger.info('Ceton tuner %s, claimed while warm, setting status to External' %
+                                              instance)
+                tuner.transition(Tuner_Status.EXTERNAL)
+                return False
+            if tuner.ceton_pcie or transport != "STOPPED":
+                return False
+
+        if (transport == "STOPPED") and (not hwinuse):
+            if status == Tuner_Status.STOP_PENDING:
+                # OK, fully stopped now, set accordingly
+                self.plugin_utils.logger.info(
+                    'Ceton tuner %s, StopPending "cleared", set status to Inactive' % instance)
+            elif status == Tuner_Status.WARM:
+                self.plugin_utils.logger.info('Ceton tuner %s, warm tuner was stopped, now Inactive' % instance)
+            elif status == Tuner_Status.EXTERNAL:
+                # No longer in use, set accordingly
+                self.plugin_utils.logger.info('Ceton tuner %s, External state "cleared", now Inactive' % instance)
+            if status != Tuner_Status.INACTIVE:
+                tuner.transition(Tuner_Status.INACTIVE)
+                tuner.stream_args = {}
+            return True
+
+        # Tuner is "in use" (or at least, not "not in use"), may take some time to get to the state fully if stopping
+        if status != Tuner_Status.STOP_PENDING:
+            if status != Tuner_Status.EXTERNAL:
+                self.plugin_utils.logger.info('Ceton tuner %s, setting status to External' % instance)
+            tuner.transition(Tuner_Status.EXTERNAL)
+        self.plugin_utils.logger.debug('Ceton tuner %s: status = %s' % (instance, tuner.status))
+        return False
+
     def get_ceton_tuner_status(self, chandict, scan=False):
-        found = 0
-        count = int(self.tuners)
-        for instance in range(count):
-
-            status = self.tunerstatus[str(instance)]['status']
-            hwinuse = False
-            device = self.tunerstatus[str(instance)]['ceton_ip']
-            instance = self.tunerstatus[str(instance)]['ceton_tuner']
-            transport = self.get_ceton_getvar(instance, "TransportState")
-            self.tunerstatus[str(instance)]['channel'] = self.get_ceton_getvar(instance, "Signal_Channel")
-            self.tunerstatus[str(instance)]['level'] = self.get_ceton_getvar(instance, "Signal_Level")
-            self.tunerstatus[str(instance)]['snr'] = self.get_ceton_getvar(instance, "Signal_SNR")
-            self.tunerstatus[str(instance)]['ber'] = self.get_ceton_getvar(instance, "Signal_BER")
-            if self.tunerstatus[str(instance)]['ceton_pcie']:
-                hwinuse = self.devinuse(instance)
-            # Check to see if transport on (rtp/udp streaming), or direct HW device access (pcie)
-            # This also handles the case of another client accessing the tuner!
-            if (status == 'Inactive') and (transport == "STOPPED") and (not hwinuse):
-                if not scan:
-                    self.plugin_utils.logger.info('Selected Ceton tuner#: %s' % str(instance))
-                else:
-                    self.plugin_utils.logger.debug('Scanning Ceton tuner#: %s' % str(instance))
-                # Return needed info now (if not in scan mode)
-                if not scan:
-                    found = 1
-                    break
-            else:
-                # Tuner is "in use" (or at least, not "not in use"), handle appropiately
-                if self.tunerstatus[str(instance)]['status'] != "Active":
-                    # Check to see if stopping, may take some time to get to the state fully
-                    if status == 'StopPending':
-                        if (transport == "STOPPED") and (not hwinuse):
-                            # OK, fully stopped now, set accordingly
-                            self.plugin_utils.logger.info(
-                                'Ceton tuner %s, StopPending "cleared", set status to Inactive' % str(instance))
-                            self.tunerstatus[str(instance)]['status'] = "Inactive"
-                            self.tunerstatus[str(instance)]['stream_args'] = {}
-                            # Return needed info now (if not in scan mode)
-                            if not scan:
-                                found = 1
-                                break
-                    else:
-                        # To get here, status is External - but check for stop => and update
-                        if (transport == "STOPPED") and (not hwinuse):
-                            # No longer in use, set accordingly
-                            self.plugin_utils.logger.info('Ceton tuner %s, External state "cleared", now Inactive' %
-                                                          str(instance))
-                            self.tunerstatus[str(instance)]['status'] = "Inactive"
-                            self.tunerstatus[str(instance)]['stream_args'] = {}
-                            # Return needed info now (if not in scan mode)
-                            if not scan:
-                                found = 1
-                                break
-                        else:
-                            # External, and still in use
-                            if self.tunerstatus[str(instance)]['status'] != "External":
-                                self.plugin_utils.logger.info('Ceton tuner %s, setting status to External' %
-                                                              str(instance))
-                            self.tunerstatus[str(instance)]['status'] = "External"
-            self.plugin_utils.logger.debug('Ceton tuner %s: status = %s' %
-                                           (str(instance), self.tunerstatus[str(instance)]['status']))
-        return found, instance
+        if scan:
+            # Polled by the tuner monitor, never alongside it
+            self.tuner_monitor.poll()
+            return 0, None, None
+
+        # Rank from the snapshot kept by the tuner monitor, in the order of the allocation policy.
+        # Tuners already on the channel go first, then warm tuners, then idle ones and recently stopped tuners last.
+        free = {Tuner_Status.WARM: [], Tuner_Status.INACTIVE: [], Tuner_Status.STOP_PENDING: []}
+        for tuner in self.ceton_tuners:
+            if tuner.status in free:
+                free[tuner.status].append(tuner.instance)
+        candidates = []
+        for instances in free.values():
+            candidates.extend(self.tuner_allocation.order(instances))
+        candidates = self.tuner_allocation.rank(candidates, chandict)
+
+        # Devices are tried in the order of their best candidate, so a warm tuner or one already on the channel
+        # is tried first. Each allocation_hedge seconds without a claim, or as soon as a device has nothing to give,
+        # the next device is tried in parallel and the first claim wins. A device silent for device_timeout is skipped.
+        # A device marked down by its circuit breaker is left out until a status poll finds it back up.
+        device_candidates = {}
+        for instance in candidates:
+            device = self.ceton_tuners[instance].device
+            if self.transports[device].health != "Down":
+                device_candidates.setdefault(device, []).append(instance)
+        devices = list(device_candidates)
+        decided = threading.Event()
+
+        claim = None
+        futures = {}
+        pending = {}
+        skipped = []
+        while not claim and (devices or pending):
+            if devices:
+                device = devices.pop(0)
+                future = self.allocation_pools[device].submit(self.claim_device_tuner, device,
+                                                              device_candidates[device], decided)
+                futures[future] = device
+                pending[future] = time.monotonic() + self.device_timeout
+
+            timeout = min(pending.values()) - time.monotonic()
+            if devices:
+                timeout = min(timeout, self.allocation_hedge)
+            done, not_done = concurrent.futures.wait(pending, timeout=max(0, timeout),
+                                                     return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                claim = claim or future.result()
+            for future in not_done:
+                if pending[future] <= time.monotonic():
+                    del pending[future]
+                    skipped.append(futures[future])
+
+        if skipped:
+            self.plugin_utils.logger.warning('Ceton device(s) %s did not answer within %s seconds, skipped' %
+                                             (", ".join(skipped), self.device_timeout))
+
+        # Give back whatever the other devices claim, now or once they answer
+        decided.set()
+        for future in futures:
+            future.add_done_callback(lambda future: self.release_claim(future.result(), claim))
+
+        if not claim:
+            self.metrics.inc("ceton_allocations_total", outcome="none")
+            return 0, None, None
+        instance, claimed_from = claim
+        self.metrics.inc("ceton_allocations_total", outcome="found")
+        with self.ceton_tuners[instance].lock:
+            self.tuner_allocation.allocated(instance, chandict)
+        self.plugin_utils.logger.info('Selected Ceton tuner#: %s' % instance)
+        return 1, instance, claimed_from
+
+    def claim_device_tuner(self, device, instances, decided):
+        # Claim and confirm the first free tuner of one device, returns (instance, claimed from status).
+        # The pick is made under the device lock, the tuner is then held as Active while it is confirmed live,
+        # so concurrent requests on the same device confirm different tuners side by side.
+        for instance in instances:
+            if decided.is_set():
+                # The request was settled while this one queued behind a slow device
+                return None
+            waiting = time.perf_counter()
+            if not self.device_locks[device].acquire(timeout=self.device_timeout):
+                self.plugin_utils.logger.warning('Ceton device %s is busy, skipped' % device)
+                return None
+            start = time.perf_counter()
+            try:
+                claimed_from = self.claim_tuner(instance, [Tuner_Status.WARM, Tuner_Status.INACTIVE,
+                                                           Tuner_Status.STOP_PENDING])
+            finally:
+                self.device_locks[device].release()
+                self.metrics.observe("ceton_lock_wait_seconds", start - waiting, lock="device", device=device)
+                self.metrics.observe("ceton_lock_hold_seconds", time.perf_counter() - start, lock="device",
+                                     device=device)
+            if not claimed_from:
+                continue
+
+            tuner = self.ceton_tuners[instance]
+            try:
+                if claimed_from == Tuner_Status.WARM:
+                    # Warm tuners are already ours, only an external open of the device can have taken it
+                    if tuner.ceton_pcie and self.devinuse(instance, fresh=True):
+                        with tuner.lock:
+                            tuner.transition(claimed_from)
+                            self.update_tuner_state(instance, None, True)
+                        self.metrics.inc("ceton_allocations_total", outcome="external")
+                        continue
+                    return instance, claimed_from
+
+                confirm = self.confirm_ceton_getvars(instance, ["TransportState", "Signal_Channel"])
+                transport = confirm["TransportState"]
+                channel = confirm["Signal_Channel"]
+                hwinuse = tuner.ceton_pcie and self.devinuse(instance, fresh=True)
+            except Exception as err:
+                self.plugin_utils.logger.error('Error while allocating Ceton tuner %s: %s' % (instance, err))
+                self.claim_tuner(instance, [Tuner_Status.ACTIVE], claimed_from)
+                continue
+
+            with tuner.lock:
+                tuner.transition(claimed_from)
+                tuner.channel = channel
+                if self.update_tuner_state(instance, transport, hwinuse):
+                    claimed_from = self.claim_tuner(instance, [Tuner_Status.INACTIVE])
+                    if claimed_from:
+                        return instance, claimed_from
+                elif tuner.status == Tuner_Status.EXTERNAL:
+                    # Taken by another client since the last poll
+                    self.metrics.inc("ceton_allocations_total", outcome="external")
+        return None
+
+    def release_claim(self, claim, kept):
+        if claim and claim != kept:
+            instance, claimed_from = claim
+            self.claim_tuner(instance, [Tuner_Status.ACTIVE], claimed_from)
 
     def startstop_ceton_tuner(self, instance, startstop):
-        if not startstop:
-            port = 0
-            self.plugin_utils.logger.info('Ceton tuner %s to be stopped' % str(instance))
-            self.tunerstatus[str(instance)]["status"] = "StopPending"
-        else:
-            self.plugin_utils.logger.info('Ceton tuner %s to be started' % str(instance))
-            self.tunerstatus[str(instance)]["status"] = "Active"
+        instance = int(instance)
+        tuner = self.ceton_tuners[instance]
+        with tuner.lock:
+            if not startstop:
+                port = 0
+                self.plugin_utils.logger.info('Ceton tuner %s to be stopped' % instance)
+                tuner.transition(Tuner_Status.STOP_PENDING)
+                tuner.subscribers = 0
+            else:
+                self.plugin_utils.logger.info('Ceton tuner %s to be started' % instance)
+                tuner.transition(Tuner_Status.ACTIVE)
 
-        StartStopUrl = 'http://%s/stream_request.cgi' % self.tunerstatus[str(instance)]['ceton_ip']
+        StartStopUrl = 'http://%s/stream_request.cgi' % tuner.device
 
         dest_ip = self.plugin_utils.config.dict["fhdhr"]["address"]
-        dest_port = self.tunerstatus[str(instance)]['port']
+        dest_port = tuner.port
 
-        StartStop_data = {"instance_id": instance,
+        StartStop_data = {"instance_id": tuner.tuner,
                           "dest_ip": dest_ip,
                           "dest_port": dest_port,
                           "protocol": 0,
                           "start": startstop}
 
         # StartStop ... OK to Stop tuner for pcie (and safe), but do not Start => or blocks pcie (/dev)!
-        if not (startstop and self.tunerstatus[str(instance)]['ceton_pcie']):
+        if not (startstop and tuner.ceton_pcie):
             try:
-                StartStopUrlReq = self.plugin_utils.web.session.post(StartStopUrl, StartStop_data)
-                StartStopUrlReq.raise_for_status()
-            except self.plugin_utils.web.exceptions.HTTPError as err:
+                with self.metrics.timer("ceton_request_seconds", device=tuner.device, request="stream_request"):
+                    self.transports[tuner.device].post(StartStopUrl, StartStop_data)
+            except Transport_Error as err:
                 self.plugin_utils.logger.error('Error while setting station stream: %s' % err)
                 return None
+            finally:
+                self.invalidate_ceton_getvars(instance)
         
         return dest_port
 
+    def invalidate_ceton_getvars(self, instance):
+        tuner = self.ceton_tuners[instance]
+        self.getvar_cache.invalidate(tuner.device, tuner.tuner)
+
     def set_ceton_tuner(self, chandict, instance):
-        tuneChannelUrl = 'http://%s/channel_request.cgi' % self.tunerstatus[str(instance)]['ceton_ip']
-        tuneChannel_data = {"instance_id": instance,
+        tuner = self.ceton_tuners[instance]
+        tuneChannelUrl = 'http://%s/channel_request.cgi' % tuner.device
+        tuneChannel_data = {"instance_id": tuner.tuner,
                             "channel": chandict['origin_number']}
 
         try:
-            tuneChannelUrlReq = self.plugin_utils.web.session.post(tuneChannelUrl, tuneChannel_data)
-            tuneChannelUrlReq.raise_for_status()
-        except self.plugin_utils.web.exceptions.HTTPError as err:
+            with self.metrics.timer("ceton_request_seconds", device=tuner.device, request="channel_request"):
+                self.transports[tuner.device].post(tuneChannelUrl, tuneChannel_data)
+        except Transport_Error as err:
             self.plugin_utils.logger.error('Error while tuning station URL: %s' % err)
             return None
+        finally:
+            self.invalidate_ceton_getvars(instance)
 
+        tuner.channel = chandict['origin_number']
         return 1
 
     def get_channels(self):
-        cleaned_channels = []
-        instance = 0 #Use the first tuner
-        url_headers = {'accept': 'application/xml;q=0.9, */*;q=0.8'}
-
-        count_url = 'http://%s/view_channel_map.cgi?page=1' % self.tunerstatus[str(instance)]['ceton_ip']
-
-        try:
-            countReq = self.plugin_utils.web.session.get(count_url, headers=url_headers)
-            countReq.raise_for_status()
-        except self.plugin_utils.web.exceptions.HTTPError as err:
-            self.plugin_utils.logger.error('Error while getting channel count: %s' % err)
-            return []
-
-        count = re.search('(?<=1 to 50 of )\w+', countReq.text)
-        count = int(count.group(0))
-        page = 0
+        with self.metrics.timer("ceton_get_channels_seconds"):
+            return self.channel_map.get()
 
-        while True:
-            stations_url = "http://%s/view_channel_map.cgi?page=%s&xml=1" % (self.tunerstatus[str(instance)]['ceton_ip'], page)
-
-            try:
-                stationsReq = self.plugin_utils.web.session.get(stations_url, headers=url_headers)
-                stationsReq.raise_for_status()
-            except self.plugin_utils.web.exceptions.HTTPError as err:
-                self.plugin_utils.logger.error('Error while getting stations: %s' % err)
-                return []
-
-            stationsRes = xmltodict.parse(stationsReq.content)
-
-            for station_item in stationsRes['channels']['channel']:
-                nameTmp = station_item["name"]
-                nameTmp_bytes = nameTmp.encode('ascii')
-                namebytes = base64.b64decode(nameTmp_bytes)
-                name = namebytes.decode('ascii')
-                clean_station_item = {
-                                        "name": name,
-                                        "callsign": name,
-                                        "number": station_item["number"],
-                                        "eia": station_item["eia"],
-                                        "id": station_item["sourceid"],
-                                        }
-
-                cleaned_channels.append(clean_station_item)
-
-            if (count > 1024):
-                count -= 1024
-                page = 21
+    def join_channel_stream(self, chandict):
+        # stream_method ceton fans a tuner out to every viewer of its channel, join a stream already running.
+        # Returns the tuner joined, None if the channel is not streaming.
+        if self.stream_method != "ceton":
+            return None
+        for tuner in self.ceton_tuners:
+            # Checked again under the lock, most tuners are not streaming and are passed over without it
+            if tuner.status != Tuner_Status.ACTIVE or not tuner.subscribers:
                 continue
-            else:
-                break
-
-            if (count > 0):
-                count -= 50
-                page += 1
-            else:
-                break
-
-        return cleaned_channels
+            with tuner.lock:
+                if (tuner.status == Tuner_Status.ACTIVE and tuner.subscribers
+                        and channel_matches(tuner.channel, chandict['origin_number'])):
+                    tuner.subscribers += 1
+                    self.plugin_utils.logger.info('Sharing Ceton tuner %s on channel %s, %s subscribers' %
+                                                  (tuner.instance, chandict['origin_number'], tuner.subscribers))
+                    return tuner.instance
+        return None
 
     def get_channel_stream(self, chandict, stream_args):
-        # Lock (immediately!) ... so "simultaneous" requests don't try to use the same tuner. Process, then release.
-        with self.lock:
-            found, instance = self.get_ceton_tuner_status(chandict)
-            self.tunerstatus[str(instance)]["stream_args"] = stream_args
-
-            # 1 to start or 0 to stop
-            if found:
-                port = self.startstop_ceton_tuner(instance, 1)
-            else:
-                port = None
-                self.plugin_utils.logger.error('No Ceton tuners available')
-
-            if port:
-                tuned = self.set_ceton_tuner(chandict, instance)
-                self.plugin_utils.logger.info('Preparing Ceton tuner %s on port: %s' % (instance, port))
-            else:
-                tuned = None
-
-            device = self.tunerstatus[str(instance)]['ceton_ip']
-            self.get_ceton_getvar(instance, "Frequency")
-            self.get_ceton_getvar(instance, "ProgramNumber")
-            self.get_ceton_getvar(instance, "CopyProtectionStatus")
-
-            if tuned:
-                if not self.tunerstatus[str(instance)]['ceton_pcie']:
-                    self.plugin_utils.logger.info('Initiate streaming channel %s from Ceton tuner#: %s ' % (chandict['origin_number'], instance))
-                else:
-                    # PCIe, only use /dev, not rtp => no additional logic needed to handle this then, and can still change stream_method (direct, ffmpeg)
-                    self.plugin_utils.logger.info('Initiate PCIe direct streaming, channel %s from Ceton tuner#: %s ' % (chandict['origin_number'], instance))
-                streamurl = self.tunerstatus[str(instance)]['streamurl']
+        start = time.perf_counter()
+        self.warm_pool.record(chandict)
+        instance = self.join_channel_stream(chandict)
+        if instance is not None:
+            self.metrics.inc("ceton_allocations_total", outcome="shared")
+            self.metrics.observe("ceton_stream_start_seconds", time.perf_counter() - start, outcome="shared")
+            return {"url": self.ceton_tuners[instance].streamurl, "tuner": instance}
+
+        # The claimed tuner is ours alone, starting and tuning it needs no lock
+        found, instance, claimed_from = self.get_ceton_tuner_status(chandict)
+
+        # 1 to start or 0 to stop
+        if found and claimed_from == Tuner_Status.WARM:
+            self.ceton_tuners[instance].stream_args = stream_args
+            port = self.warm_pool.claim(instance)
+        elif found:
+            self.ceton_tuners[instance].stream_args = stream_args
+            port = self.startstop_ceton_tuner(instance, 1)
+        else:
+            port = None
+            self.plugin_utils.logger.error('No Ceton tuners available')
+            self.metrics.observe("ceton_stream_start_seconds", time.perf_counter() - start, outcome="none")
+            return {"url": None, "tuner": None}
+
+        if port and channel_matches(self.ceton_tuners[instance].channel, chandict['origin_number']):
+            # Tuner is still sitting on the requested channel, no retune needed
+            tuned = 1
+            self.plugin_utils.logger.info('Reusing Ceton tuner %s, already on channel %s, on port: %s' %
+                                          (instance, chandict['origin_number'], port))
+        elif port:
+            tuned = self.set_ceton_tuner(chandict, instance)
+            self.plugin_utils.logger.info('Preparing Ceton tuner %s on port: %s' % (instance, port))
+        else:
+            tuned = None
+
+        if found and not tuned:
+            # Do not leave a tuner claimed that will never stream
+            self.startstop_ceton_tuner(instance, 0)
+
+        if tuned:
+            self.ceton_tuners[instance].subscribers = 1
+            # Frequency, program and CCI are collected in the background, once the stream is on its way
+            self.tune_history.record(instance, chandict)
+            if not self.ceton_tuners[instance].ceton_pcie:
+                self.plugin_utils.logger.info('Initiate streaming channel %s from Ceton tuner#: %s ' % (chandict['origin_number'], instance))
             else:
-                streamurl = None
+                # PCIe, only use /dev, not rtp => no additional logic needed to handle this then, and can still change stream_method (direct, ffmpeg)
+                self.plugin_utils.logger.info('Initiate PCIe direct streaming, channel %s from Ceton tuner#: %s ' % (chandict['origin_number'], instance))
+            streamurl = self.ceton_tuners[instance].streamurl
+        else:
+            streamurl = None
 
-            stream_info = {"url": streamurl, "tuner": instance}
+        stream_info = {"url": streamurl, "tuner": instance}
+        self.metrics.observe("ceton_stream_start_seconds", time.perf_counter() - start,
+                             outcome="tuned" if tuned else "failed")
 
-            return stream_info
+        return stream_info
 
     def close_stream(self, instance, stream_args):
-        closetuner = stream_args["stream_info"]["tuner"]
+        closetuner = int(stream_args["stream_info"]["tuner"])
+        tuner = self.ceton_tuners[closetuner]
+        with tuner.lock:
+            if tuner.subscribers > 1:
+                # Other viewers are still on this tuner, only the last one stops it
+                tuner.subscribers -= 1
+                self.plugin_utils.logger.info('Leaving Ceton tuner %s (fHDHR tuner %s), %s subscribers left' %
+                                              (closetuner, instance, tuner.subscribers))
+                return
+            tuner.subscribers = 0
         self.plugin_utils.logger.info('Closing Ceton tuner %s (fHDHR tuner %s)' % (closetuner, instance))
-        self.startstop_ceton_tuner(closetuner, 0)
+        if not self.warm_pool.park(closetuner):
+            self.startstop_ceton_tuner(closetuner, 0)
         return
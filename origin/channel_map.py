@@ -0,0 +1,170 @@
+import base64
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import xml.etree.ElementTree as ElementTree
+
+from .transport import Transport_Error
+
+
+class Channel_Map():
+    # An xml page of view_channel_map.cgi lists up to 1024 channels,
+    # the next one that does not overlap is 21 pages (of 50) further on
+    xml_page_channels = 1024
+    xml_page_stride = 21
+
+    def __init__(self, origin, cache_file):
+        self.origin = origin
+        self.cache_file = cache_file
+
+        self.refresh_lock = threading.Lock()
+        self.startup = True
+
+        # page number -> {"hash": sha1 of the page xml, "channels": [cleaned channels]}
+        self.pages = {}
+        self.lineup = None
+        self.load_cache()
+
+    @property
+    def plugin_utils(self):
+        return self.origin.plugin_utils
+
+    @property
+    def device(self):
+        # The lineup is read from the first device
+        return self.origin.ceton_tuners[self.origin.device_instances[0]].device
+
+    def get(self):
+        # Serve the lineup from the disk cache the first time round, and bring it up to date in the background
+        startup, self.startup = self.startup, False
+        if startup and self.lineup is not None:
+            threading.Thread(target=self.refresh, name="ceton_channel_map", daemon=True).start()
+            return self.lineup
+        return self.refresh()
+
+    def refresh(self):
+        with self.refresh_lock, self.origin.metrics.timer("ceton_channel_map_seconds", stage="refresh"):
+            device = self.device
+            url_headers = {'accept': 'application/xml;q=0.9, */*;q=0.8'}
+
+            count_url = 'http://%s/view_channel_map.cgi?page=1' % device
+
+            try:
+                countReq = self.origin.transports[device].get(count_url, headers=url_headers)
+            except Transport_Error as err:
+                self.plugin_utils.logger.error('Error while getting channel count: %s' % err)
+                return self.lineup or []
+
+            count = re.search(r'(?<=1 to 50 of )\d+', countReq.text)
+            if not count:
+                self.plugin_utils.logger.error('Unexpected channel map page from Ceton device %s' % device)
+                return self.lineup or []
+            count = int(count.group(0))
+
+            xml_pages = max(1, -(-count // self.xml_page_channels))
+            page_numbers = [page * self.xml_page_stride for page in range(xml_pages)]
+
+            futures = {}
+            for page in page_numbers:
+                stations_url = "http://%s/view_channel_map.cgi?page=%s&xml=1" % (device, page)
+                futures[self.origin.getvar_pools[device].submit(self.fetch_page, stations_url, url_headers)] = page
+
+            contents = {}
+            for future in concurrent.futures.as_completed(futures):
+                contents[futures[future]] = future.result()
+            if None in contents.values():
+                return self.lineup or []
+
+            pages = {}
+            parsed = 0
+            for page in page_numbers:
+                page_hash = hashlib.sha1(contents[page]).hexdigest()
+                if page in self.pages and self.pages[page]["hash"] == page_hash:
+                    pages[page] = self.pages[page]
+                else:
+                    pages[page] = {"hash": page_hash, "channels": self.parse_page(contents[page])}
+                    parsed += 1
+                    self.origin.metrics.inc("ceton_channel_map_pages_parsed_total")
+
+            # Pages can overlap, keep the first occurrence of each channel
+            lineup = []
+            seen = set()
+            for page in page_numbers:
+                for channel in pages[page]["channels"]:
+                    if channel["number"] not in seen:
+                        seen.add(channel["number"])
+                        lineup.append(channel)
+
+            if parsed:
+                self.plugin_utils.logger.info('Ceton channel map changed: %s of %s pages parsed, %s channels' %
+                                              (parsed, len(page_numbers), len(lineup)))
+            else:
+                self.plugin_utils.logger.debug('Ceton channel map unchanged, %s channels' % len(lineup))
+
+            changed = parsed or list(pages) != list(self.pages)
+            self.pages = pages
+            self.lineup = lineup
+            if changed:
+                self.save_cache()
+            return lineup
+
+    def fetch_page(self, stations_url, url_headers):
+        try:
+            with self.origin.metrics.timer("ceton_channel_map_seconds", stage="page"):
+                stationsReq = self.origin.transports[self.device].get(stations_url, headers=url_headers)
+        except Transport_Error as err:
+            self.plugin_utils.logger.error('Error while getting stations: %s' % err)
+            return None
+        return stationsReq.content
+
+    def parse_page(self, content):
+        cleaned_channels = []
+        for event, element in ElementTree.iterparse(io.BytesIO(content), events=("end",)):
+            if element.tag != "channel":
+                continue
+
+            nameTmp = element.findtext("name") or ""
+            nameTmp_bytes = nameTmp.encode('ascii')
+            namebytes = base64.b64decode(nameTmp_bytes)
+            name = namebytes.decode('ascii', errors='replace')
+            clean_station_item = {
+                                    "name": name,
+                                    "callsign": name,
+                                    "number": element.findtext("number"),
+                                    "eia": element.findtext("eia"),
+                                    "id": element.findtext("sourceid"),
+                                    }
+
+            cleaned_channels.append(clean_station_item)
+            element.clear()
+        return cleaned_channels
+
+    def load_cache(self):
+        if not os.path.isfile(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as cache:
+                cached = json.load(cache)
+        except (OSError, ValueError) as err:
+            self.plugin_utils.logger.warning('Ignoring unreadable Ceton channel map cache %s: %s' % (self.cache_file, err))
+            return
+
+        if cached.get("device") != self.device:
+            return
+        self.pages = {int(page): cached["pages"][page] for page in cached["pages"]}
+        self.lineup = cached["lineup"]
+        self.plugin_utils.logger.info('Loaded %s channels from the Ceton channel map cache' % len(self.lineup))
+
+    def save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = "%s.tmp" % self.cache_file
+            with open(tmp_file, 'w') as cache:
+                json.dump({"device": self.device, "pages": self.pages, "lineup": self.lineup}, cache)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as err:
+            self.plugin_utils.logger.warning('Unable to write Ceton channel map cache %s: %s' % (self.cache_file, err))
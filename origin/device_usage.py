@@ -0,0 +1,68 @@
+import os
+import subprocess
+import threading
+import time
+
+
+class Device_Usage():
+    # In-process replacement for `fuser /dev/ctn91xx_mpeg0_N`.
+    # One walk of /proc/*/fd answers every tuner, and is reused for ttl seconds.
+
+    def __init__(self, ttl=1.0, proc_root="/proc"):
+        self.ttl = ttl
+        self.proc_root = proc_root
+
+        self.lock = threading.Lock()
+        self.index = None
+        self.indexed_at = 0
+
+    def in_use(self, filename, fresh=False):
+        with self.lock:
+            if fresh or self.index is None or (time.monotonic() - self.indexed_at) >= self.ttl:
+                self.index = self.scan()
+                self.indexed_at = time.monotonic()
+            index = self.index
+
+        if index is None:
+            return self.fuser(filename)
+        return filename in index
+
+    def scan(self):
+        # Returns the set of /dev nodes held open by any process, None if /proc can not be used
+        try:
+            pids = [pid for pid in os.listdir(self.proc_root) if pid.isdigit()]
+        except OSError:
+            return None
+
+        index = set()
+        readable = False
+        for pid in pids:
+            fd_dir = os.path.join(self.proc_root, pid, "fd")
+            try:
+                fds = os.listdir(fd_dir)
+            except OSError:
+                # Process exited, or belongs to another user
+                continue
+            readable = True
+            for fd in fds:
+                try:
+                    target = os.readlink(os.path.join(fd_dir, fd))
+                except OSError:
+                    continue
+                if target.startswith("/dev/"):
+                    index.add(target)
+
+        if not readable:
+            return None
+        return index
+
+    def fuser(self, filename):
+        try:
+            subprocess.check_output(['fuser', filename], stderr=subprocess.DEVNULL)
+            # man: if access has been found, fuser returns zero
+            # => Return True, device is in use
+            return True
+        except subprocess.CalledProcessError:
+            # man: fuser returns a non-zero return code if none of the specified files is accessed
+            # => Return False, device is not in use
+            return False
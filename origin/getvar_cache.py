@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class GetVar_Cache():
+
+    def __init__(self, max_entries, stale_factor=5):
+        self.max_entries = max_entries
+        # A stale value is served (while refreshing in the background) for up to stale_factor * ttl
+        self.stale_factor = stale_factor
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.fetching = {}
+        self.refreshing = set()
+
+    def get(self, key, ttl, fetch, submit):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                value, fetched = entry
+                age = time.monotonic() - fetched
+                if ttl is None or age < ttl:
+                    self.entries.move_to_end(key)
+                    return value
+                if age < ttl * self.stale_factor:
+                    if key not in self.refreshing:
+                        self.refreshing.add(key)
+                        submit(self.refresh, key, fetch)
+                    self.entries.move_to_end(key)
+                    return value
+
+            # Nothing usable cached, if another caller is already fetching it just wait for that result
+            pending = self.fetching.get(key)
+            if not pending:
+                pending = self.fetching[key] = threading.Event()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            pending.wait()
+            with self.lock:
+                entry = self.entries.get(key)
+            if entry:
+                return entry[0]
+            return fetch()
+
+        try:
+            value = fetch()
+            self.set(key, value)
+        finally:
+            with self.lock:
+                del self.fetching[key]
+            pending.set()
+        return value
+
+    def refresh(self, key, fetch):
+        try:
+            self.set(key, fetch())
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def set(self, key, value):
+        # Failed lookups are not cached, a stale value is better than none
+        if value is None:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, device, tuner):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == device and key[1] == tuner]:
+                del self.entries[key]
@@ -0,0 +1,95 @@
+import bisect
+import threading
+import time
+
+
+class Metrics():
+    # Counters and latency histograms kept in memory, served in the Prometheus text format.
+    # An observation is a perf_counter pair, a bisect and a dict update under one lock.
+
+    buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    types = {
+             "ceton_getvar_seconds": ("histogram", "get_var request latency by device and query"),
+             "ceton_getvar_errors_total": ("counter", "get_var requests that failed, by device and query"),
+             "ceton_request_seconds": ("histogram", "stream_request.cgi and channel_request.cgi latency by device"),
+             "ceton_lock_wait_seconds": ("histogram", "Time spent waiting for a device lock or get_var connection"),
+             "ceton_lock_hold_seconds": ("histogram", "Time a device lock or get_var connection was held"),
+             "ceton_allocations_total": ("counter", "Tuner allocation outcomes"),
+             "ceton_stream_start_seconds": ("histogram", "get_channel_stream time to stream URL, by outcome"),
+             "ceton_channel_map_seconds": ("histogram", "Channel map fetch durations, per page and in total"),
+             "ceton_channel_map_pages_parsed_total": ("counter", "Channel map xml pages parsed, unchanged pages are skipped"),
+             "ceton_get_channels_seconds": ("histogram", "get_channels duration"),
+             "ceton_tuners": ("gauge", "Tuners by status"),
+             "ceton_tuner_subscribers": ("gauge", "Viewers sharing each tuner"),
+             "ceton_device_up": ("gauge", "1 while the circuit breaker of a device lets requests through"),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        # (name, labels) -> [count per bucket..., count above the last bucket, sum]
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(self.buckets) + 2)
+            histogram[bucket] += 1
+            histogram[-1] += seconds
+
+    def timer(self, name, **labels):
+        return Timer(self, name, labels)
+
+    def render(self, gauges=None):
+        # gauges: {(name, labels): value} sampled by the caller at scrape time
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: list(histogram) for key, histogram in self.histograms.items()}
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels), value in (gauges or {}).items():
+            samples.setdefault(name, []).append((name, tuple(sorted(labels)), value))
+        for (name, labels), histogram in histograms.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), histogram):
+                cumulative += count
+                samples.setdefault(name, []).append(("%s_bucket" % name, labels + (("le", str(bound)),), cumulative))
+            samples[name].append(("%s_sum" % name, labels, histogram[-1]))
+            samples[name].append(("%s_count" % name, labels, cumulative))
+
+        lines = []
+        for name in sorted(samples):
+            kind, description = self.types.get(name, ("untyped", name))
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for sample, labels, value in samples[name]:
+                if labels:
+                    sample += "{%s}" % ",".join('%s="%s"' % (key, str(label).replace('"', '\\"'))
+                                                for key, label in labels)
+                lines.append("%s %s" % (sample, value))
+        return "\n".join(lines) + "\n"
+
+
+class Timer():
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
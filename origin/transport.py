@@ -0,0 +1,99 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class Transport_Error(Exception):
+    pass
+
+
+class Device_Down(Transport_Error):
+    pass
+
+
+class Device_Transport():
+    # Keep-alive HTTP to one Ceton device, with connect/read timeouts, retries with backoff and a circuit breaker.
+    # After `failures` calls in a row fail, the device is marked Down and its calls fail at once,
+    # until a single trial call `reset` seconds later gets through.
+
+    backoff_factor = 0.2
+
+    def __init__(self, device, pool_size, connect_timeout, read_timeout, retries, failures, reset,
+                 logger, on_health=None):
+        self.device = device
+        self.timeout = (connect_timeout, read_timeout)
+        self.failure_threshold = failures
+        self.reset = reset
+        self.logger = logger
+        self.on_health = on_health
+
+        # Only GETs are retried once sent, a POST is retried when it could not connect
+        retry = Retry(total=retries, backoff_factor=self.backoff_factor, status_forcelist=[500, 502, 503, 504],
+                      allowed_methods=["GET"], raise_on_status=False)
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+
+        self.lock = threading.Lock()
+        self.health = "Up"
+        self.failures = 0
+        self.down_since = 0
+        self.trial = False
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request("POST", url, data=data, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        self.admit()
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.exceptions.RequestException as err:
+            self.failed(err)
+            raise Transport_Error("Ceton device %s: %s" % (self.device, err))
+        if response.status_code >= 500:
+            self.failed("HTTP %s" % response.status_code)
+            raise Transport_Error("Ceton device %s: HTTP %s for %s" % (self.device, response.status_code, url))
+        # The device answered, a client error does not count against it
+        self.succeeded()
+        if response.status_code >= 400:
+            raise Transport_Error("Ceton device %s: HTTP %s for %s" % (self.device, response.status_code, url))
+        return response
+
+    def admit(self):
+        with self.lock:
+            if self.health == "Up":
+                return
+            if self.health == "Down" and time.monotonic() - self.down_since >= self.reset and not self.trial:
+                self.trial = True
+                self.set_health("Recovering")
+                return
+        raise Device_Down("Ceton device %s is down" % self.device)
+
+    def failed(self, err):
+        with self.lock:
+            self.failures += 1
+            self.trial = False
+            if self.health == "Recovering" or (self.health == "Up" and self.failures >= self.failure_threshold):
+                self.down_since = time.monotonic()
+                self.logger.error('Ceton device %s marked down after %s failed requests, retrying in %s seconds: %s' %
+                                  (self.device, self.failures, self.reset, err))
+                self.set_health("Down")
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.trial = False
+            if self.health != "Up":
+                self.logger.info('Ceton device %s is back up' % self.device)
+                self.set_health("Up")
+
+    def set_health(self, health):
+        # Called with the lock held
+        self.health = health
+        if self.on_health:
+            self.on_health(self.device, health)
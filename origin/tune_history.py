@@ -0,0 +1,88 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+
+class Tune_History():
+    # Post-tune diagnostics, collected off the stream start path into a ring buffer per tuner
+
+    # Time to lock is polled at once, then 0.1, 0.2, 0.4 ... seconds apart, lock_polls times at most (3.1 seconds)
+    lock_poll = 0.1
+    lock_polls = 6
+
+    # Signal_Carrier_Lock answers. A device answering anything else is reported once and not polled again.
+    locked_values = ["locked", "yes", "true", "1"]
+    unlocked_values = ["unlocked", "no", "false", "0"]
+
+    def __init__(self, origin, size):
+        self.origin = origin
+        self.size = size
+
+        self.lock = threading.Lock()
+        self.history = {}
+        self.unknown_lock_devices = set()
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="ceton_diag")
+
+    def record(self, instance, chandict):
+        tuned = time.monotonic()
+        self.pool.submit(self.collect, instance, str(chandict['origin_number']), tuned)
+
+    def collect(self, instance, channel, tuned):
+        try:
+            time_to_lock = None
+            device = self.origin.ceton_tuners[instance].device
+            delay = self.lock_poll
+            for poll in range(self.lock_polls if device not in self.unknown_lock_devices else 0):
+                if poll:
+                    time.sleep(delay)
+                    delay *= 2
+                carrier_lock = self.carrier_locked(device, self.origin.get_ceton_getvar(instance, "SignalCarrierLock",
+                                                                                        fresh=True))
+                if carrier_lock is None:
+                    break
+                if carrier_lock:
+                    time_to_lock = round((time.monotonic() - tuned) * 1000)
+                    break
+
+            getvars = self.origin.get_ceton_getvars([(instance, "Frequency"), (instance, "ProgramNumber"),
+                                                     (instance, "CopyProtectionStatus")], fresh=True)
+            entry = {
+                     "channel": channel,
+                     "frequency": getvars[(instance, "Frequency")],
+                     "program": getvars[(instance, "ProgramNumber")],
+                     "cci": getvars[(instance, "CopyProtectionStatus")],
+                     "time_to_lock_ms": time_to_lock,
+                     "time": time.time(),
+                     }
+        except Exception as err:
+            self.origin.plugin_utils.logger.error('Error while collecting Ceton tuner %s diagnostics: %s' % (instance, err))
+            return
+
+        with self.lock:
+            if instance not in self.history:
+                self.history[instance] = collections.deque(maxlen=self.size)
+            self.history[instance].append(entry)
+
+    def carrier_locked(self, device, value):
+        # True or False from a Signal_Carrier_Lock answer, None if it was not read or is not known
+        if value is None:
+            return None
+        value = str(value).strip().lower()
+        if value in self.locked_values:
+            return True
+        if value in self.unlocked_values:
+            return False
+        with self.lock:
+            if device in self.unknown_lock_devices:
+                return None
+            self.unknown_lock_devices.add(device)
+        self.origin.plugin_utils.logger.warning('Ceton device %s answers "%s" to Signal_Carrier_Lock, '
+                                                'time to lock is not measured' % (device, value))
+        return None
+
+    def get(self, instance=None):
+        with self.lock:
+            if instance is not None:
+                return {str(instance): list(self.history.get(instance, []))}
+            return {str(tuner): list(entries) for tuner, entries in self.history.items()}
@@ -0,0 +1,67 @@
+import time
+
+
+def channel_matches(tuned_channel, origin_number):
+    # Signal_Channel reports the virtual channel the tuner is sitting on, compare on the number alone
+    if tuned_channel is None or origin_number is None:
+        return False
+    tuned_channel = str(tuned_channel).strip().split(' ')[0]
+    return tuned_channel == str(origin_number).strip()
+
+
+class Allocation_Policy():
+    # Order free tuners in index order, the historical behaviour
+
+    def __init__(self, origin):
+        self.origin = origin
+
+    def order(self, candidates):
+        return list(candidates)
+
+    def rank(self, candidates, chandict):
+        # Tuners already sitting on the requested channel need no retune, always try them first
+        if not chandict:
+            return candidates
+        warm = [instance for instance in candidates
+                if channel_matches(self.origin.ceton_tuners[instance].channel, chandict.get('origin_number'))]
+        return warm + [instance for instance in candidates if instance not in warm]
+
+    def allocated(self, instance, chandict):
+        tuner = self.origin.ceton_tuners[instance]
+        if chandict and channel_matches(tuner.channel, chandict.get('origin_number')):
+            tuner.reused += 1
+        tuner.allocations += 1
+        tuner.last_allocated = time.time()
+
+
+class Round_Robin(Allocation_Policy):
+    # Rotate through the devices, so every card takes its turn
+
+    def __init__(self, origin):
+        super().__init__(origin)
+        self.next_device = 0
+
+    def order(self, candidates):
+        devices = len(self.origin.device_instances)
+        return sorted(candidates, key=lambda instance: (
+            (self.origin.ceton_tuners[instance].device_index - self.next_device) % devices,
+            self.origin.ceton_tuners[instance].last_allocated))
+
+    def allocated(self, instance, chandict):
+        super().allocated(instance, chandict)
+        devices = len(self.origin.device_instances)
+        self.next_device = (self.origin.ceton_tuners[instance].device_index + 1) % devices
+
+
+class Least_Recently_Used(Allocation_Policy):
+    # Pick the tuner that has been idle the longest, spreading use (and heat) over all cards
+
+    def order(self, candidates):
+        return sorted(candidates, key=lambda instance: self.origin.ceton_tuners[instance].last_allocated)
+
+
+allocation_policies = {
+                       "first": Allocation_Policy,
+                       "roundrobin": Round_Robin,
+                       "lru": Least_Recently_Used,
+}
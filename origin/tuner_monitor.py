@@ -0,0 +1,28 @@
+import threading
+
+
+class Tuner_Monitor():
+
+    def __init__(self, origin, interval):
+        self.origin = origin
+        self.interval = interval
+
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="ceton_tuner_monitor", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def poll(self):
+        # Refresh now instead of waiting for the next interval
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            try:
+                self.origin.update_ceton_tuner_status()
+                self.origin.warm_pool.maintain()
+            except Exception as err:
+                self.origin.plugin_utils.logger.error('Error while monitoring Ceton tuners: %s' % err)
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
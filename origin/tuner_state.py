@@ -0,0 +1,92 @@
+import threading
+
+
+class Tuner_State_Error(Exception):
+    pass
+
+
+class Tuner_Status():
+    # The tuner states. Plain strings rather than an enum.Enum, whose member lookups are slow enough
+    # on the Python versions fHDHR runs on to dominate the allocation scans.
+    PROBING = "Probing"
+    INACTIVE = "Inactive"
+    ACTIVE = "Active"
+    WARM = "Warm"
+    STOP_PENDING = "StopPending"
+    EXTERNAL = "External"
+
+
+# Legal moves of the tuner state machine, staying in the same state is always allowed
+transitions = {
+               # probe_device stops every tuner of a device once it answers
+               Tuner_Status.PROBING: {Tuner_Status.STOP_PENDING},
+               # claimed, taken by another client, or stopped
+               Tuner_Status.INACTIVE: {Tuner_Status.ACTIVE, Tuner_Status.EXTERNAL, Tuner_Status.STOP_PENDING},
+               # stopped, parked in the warm pool, or a claim given back to the status it was taken from
+               Tuner_Status.ACTIVE: {Tuner_Status.STOP_PENDING, Tuner_Status.WARM, Tuner_Status.INACTIVE},
+               Tuner_Status.WARM: {Tuner_Status.ACTIVE, Tuner_Status.EXTERNAL, Tuner_Status.INACTIVE,
+                                   Tuner_Status.STOP_PENDING},
+               Tuner_Status.STOP_PENDING: {Tuner_Status.ACTIVE, Tuner_Status.INACTIVE},
+               Tuner_Status.EXTERNAL: {Tuner_Status.INACTIVE, Tuner_Status.STOP_PENDING},
+}
+
+
+class Tuner():
+    # The state of one tuner, held in Plugin_OBJ.ceton_tuners at its global index.
+    # device_index and tuner are the device it is on and its index on that device, as the device numbers it.
+
+    __slots__ = ["instance", "device", "device_index", "tuner", "lock", "status", "generation", "channel", "subscribers",
+                 "allocations", "reused", "last_allocated", "device_health", "ceton_pcie", "port", "streamurl",
+                 "transport", "hwinuse", "stream_args"]
+
+    def __init__(self, instance, device, device_index, tuner, port, device_health):
+        self.instance = instance
+        self.device = device
+        self.device_index = device_index
+        self.tuner = tuner
+        self.lock = threading.RLock()
+        # Probing until the device has answered, see probe_device
+        self.status = Tuner_Status.PROBING
+        # Counts the transitions, a reading taken before the last one is out of date
+        self.generation = 0
+        self.channel = None
+        self.subscribers = 0
+        self.allocations = 0
+        self.reused = 0
+        self.last_allocated = 0
+        self.device_health = device_health
+        # Network tuner until the probe finds a PCIe device
+        self.ceton_pcie = False
+        self.port = port
+        self.streamurl = "udp://127.0.0.1:%s" % port
+        self.transport = None
+        self.hwinuse = False
+        self.stream_args = {}
+
+    def transition(self, status):
+        # status is only ever changed through here, to the states the current one can move to
+        if status != self.status and status not in transitions[self.status]:
+            raise Tuner_State_Error("Ceton tuner %s can not go from %s to %s" % (self.instance, self.status, status))
+        self.status = status
+        self.generation += 1
+
+    def to_dict(self):
+        # The JSON view served by /api/ceton?method=status, which adds the signal readings
+        return {
+                "ceton_ip": self.device,
+                "ceton_device": str(self.device_index),
+                "ceton_tuner": str(self.tuner),
+                "status": self.status,
+                "channel": self.channel,
+                "subscribers": self.subscribers,
+                "allocations": self.allocations,
+                "reused": self.reused,
+                "last_allocated": self.last_allocated,
+                "device_health": self.device_health,
+                "ceton_pcie": self.ceton_pcie,
+                "port": self.port,
+                "streamurl": self.streamurl,
+                "transport": self.transport,
+                "hwinuse": self.hwinuse,
+                "stream_args": self.stream_args,
+        }
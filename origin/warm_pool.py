@@ -0,0 +1,96 @@
+import collections
+import threading
+
+from .tuner_allocation import channel_matches
+from .tuner_state import Tuner_Status
+
+
+class Warm_Pool():
+    # Keeps up to `size` tuners parked (Tuner_Status.WARM) with their transport running and tuned to a likely channel,
+    # so a stream start is at most a retune. Warm tuners are still released to external clients.
+
+    def __init__(self, origin, size, favorites, history_size):
+        self.origin = origin
+        self.size = size
+        self.favorites = [str(channel) for channel in favorites if str(channel)]
+        self.history = collections.deque(maxlen=history_size)
+        self.lock = threading.Lock()
+
+    @property
+    def plugin_utils(self):
+        return self.origin.plugin_utils
+
+    def warm_tuners(self):
+        return [tuner.instance for tuner in self.origin.ceton_tuners if tuner.status == Tuner_Status.WARM]
+
+    def record(self, chandict):
+        if self.size:
+            with self.lock:
+                self.history.append(str(chandict['origin_number']))
+
+    def wanted_channels(self):
+        # Favorites first, then the most watched channels of the recent history
+        wanted = list(self.favorites)
+        with self.lock:
+            hits = collections.Counter(self.history)
+        for channel, count in hits.most_common():
+            if channel not in wanted:
+                wanted.append(channel)
+        return wanted[:self.size]
+
+    def claim(self, instance):
+        # A warm tuner was claimed for a stream, its transport is already running
+        self.plugin_utils.logger.info('Ceton tuner %s taken from the warm pool' % str(instance))
+        return self.origin.ceton_tuners[instance].port
+
+    def park(self, instance):
+        # A stream closes, keep the tuner running if the pool has room
+        if not self.size:
+            return False
+        with self.lock:
+            if len(self.warm_tuners()) >= self.size:
+                return False
+            tuner = self.origin.ceton_tuners[int(instance)]
+            with tuner.lock:
+                if not self.origin.claim_tuner(tuner.instance, [Tuner_Status.ACTIVE], Tuner_Status.WARM):
+                    return False
+                tuner.stream_args = {}
+        self.plugin_utils.logger.info('Ceton tuner %s parked in the warm pool' % str(instance))
+        return True
+
+    def maintain(self):
+        # Called by the tuner monitor: top the pool up from idle tuners, and move warm tuners onto wanted channels.
+        # Tuners being prepared are claimed as Active so nothing else touches them while the requests are sent.
+        if not self.size:
+            return
+
+        wanted = self.wanted_channels()
+        warm = self.warm_tuners()
+        covered = [self.origin.ceton_tuners[instance].channel for instance in warm]
+        uncovered = [channel for channel in wanted
+                     if not any(channel_matches(tuned, channel) for tuned in covered)]
+
+        idle = self.origin.tuner_allocation.order(
+            [tuner.instance for tuner in self.origin.ceton_tuners if tuner.status == Tuner_Status.INACTIVE])
+        starting = [instance for instance in idle[:max(0, self.size - len(warm))]
+                    if self.origin.claim_tuner(instance, [Tuner_Status.INACTIVE])]
+
+        retuning = [instance for instance in warm
+                    if not any(channel_matches(self.origin.ceton_tuners[instance].channel, channel)
+                               for channel in wanted)]
+        retuning = [instance for instance in retuning[:max(0, len(uncovered) - len(starting))]
+                    if self.origin.claim_tuner(instance, [Tuner_Status.WARM])]
+
+        for instance in starting + retuning:
+            channel = uncovered.pop(0) if uncovered else None
+            ready = True
+            if instance in starting:
+                ready = self.origin.startstop_ceton_tuner(instance, 1) is not None
+            if ready and channel:
+                ready = self.origin.set_ceton_tuner({"origin_number": channel}, instance) is not None
+
+            if ready and self.origin.claim_tuner(instance, [Tuner_Status.ACTIVE], Tuner_Status.WARM):
+                self.plugin_utils.logger.info('Ceton tuner %s warmed up on channel %s' %
+                                              (str(instance), self.origin.ceton_tuners[instance].channel))
+            else:
+                self.origin.startstop_ceton_tuner(instance, 0)
@@ -0,0 +1,78 @@
+import urllib.parse
+
+import fHDHR.exceptions
+
+from .udp_receiver import UDP_Receiver
+from .pcie_reader import PCIe_Reader
+from .fan_out import join
+
+
+class Plugin_OBJ():
+    # stream_method "ceton": read a tuner in-process, the UDP port of a network tuner or the device node
+    # of a PCIe tuner, instead of an ffmpeg process per stream
+
+    def __init__(self, fhdhr, plugin_utils, stream_args, tuner):
+        self.fhdhr = fhdhr
+        self.plugin_utils = plugin_utils
+        self.stream_args = stream_args
+        self.tuner = tuner
+
+        self.bytes_per_read = int(self.fhdhr.config.dict["streaming"]["bytes_per_read"])
+
+    @property
+    def config_dict(self):
+        return self.plugin_utils.config.dict["ceton"]
+
+    @property
+    def udp_receive_buffer(self):
+        return int(self.config_dict["udp_receive_buffer"])
+
+    @property
+    def fan_out_buffer(self):
+        return int(self.config_dict["fan_out_buffer"])
+
+    @property
+    def stream_timeout(self):
+        return float(self.config_dict["stream_timeout"])
+
+    def get(self):
+        streamurl = self.stream_args["stream_info"]["url"]
+        instance = self.stream_args["stream_info"]["tuner"]
+
+        # Viewers of the channel a tuner is on share one read of it
+        try:
+            fan_out, subscriber = join(instance, lambda: self.open_reader(instance, streamurl), self.fan_out_buffer,
+                                       self.plugin_utils.logger)
+        except OSError as err:
+            self.plugin_utils.logger.error('Unable to read Ceton tuner %s from %s: %s' % (instance, streamurl, err))
+            raise fHDHR.exceptions.TunerError("806 - Tune Failed")
+        stream_readers = self.plugin_utils.origin_obj.stream_readers
+        stream_readers[instance] = fan_out
+        self.plugin_utils.logger.info('Ceton tuner %s streaming to %s subscriber(s)' %
+                                      (instance, fan_out.subscriber_count()))
+
+        def generate():
+            try:
+                for chunk in fan_out.read(subscriber, self.tuner.tuner_lock.locked):
+                    yield chunk
+            finally:
+                if fan_out.leave(subscriber):
+                    if stream_readers.get(instance) is fan_out:
+                        del stream_readers[instance]
+                    self.plugin_utils.logger.info('Ceton tuner %s stream closed: %s' % (instance, fan_out.stats()))
+
+        return generate()
+
+    def open_reader(self, instance, streamurl):
+        url = urllib.parse.urlsplit(streamurl)
+        if url.scheme == "udp":
+            reader = UDP_Receiver(url.port, self.bytes_per_read, self.udp_receive_buffer, self.stream_timeout)
+        elif streamurl.startswith("/dev/"):
+            reader = PCIe_Reader(streamurl, self.bytes_per_read, self.stream_timeout)
+        else:
+            self.plugin_utils.logger.error('Ceton stream method can not read %s' % streamurl)
+            raise fHDHR.exceptions.TunerError("806 - Tune Failed")
+
+        reader.open()
+        self.plugin_utils.logger.info('Reading Ceton tuner %s from %s' % (instance, streamurl))
+        return reader
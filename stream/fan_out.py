@@ -0,0 +1,130 @@
+import threading
+
+
+# Running fan-outs by tuner
+fan_outs = {}
+fan_outs_lock = threading.Lock()
+
+
+def join(instance, open_reader, ring_size, logger):
+    # Subscribe to the fan-out of a tuner, starting it with a reader from open_reader() if there is none
+    with fan_outs_lock:
+        fan_out = fan_outs.get(instance)
+        if fan_out and fan_out.alive:
+            return fan_out, fan_out.subscribe()
+        fan_out = Fan_Out(instance, open_reader(), ring_size, logger)
+        fan_outs[instance] = fan_out
+        subscriber = fan_out.subscribe()
+        fan_out.start()
+        return fan_out, subscriber
+
+
+class Subscriber():
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.dropped = False
+
+
+class Fan_Out():
+    # One upstream read per tuner, copied once into a ring buffer that every subscriber reads at its own cursor.
+    # A subscriber falling a whole ring behind is dropped, instead of holding up the tuner for everyone.
+    # The memoryviews handed out point into the ring, a dropped subscriber's last chunk may be overwritten.
+
+    def __init__(self, instance, reader, ring_size, logger):
+        self.instance = instance
+        self.reader = reader
+        self.logger = logger
+
+        # Whole TS packets, and room for several upstream chunks
+        ring_size = max(ring_size, reader.chunk_size * 4)
+        self.ring = bytearray(ring_size - ring_size % 188)
+        self.view = memoryview(self.ring)
+        self.written = 0
+
+        self.condition = threading.Condition()
+        self.subscribers = []
+        self.alive = True
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.pump, name="ceton_fan_out", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stats(self):
+        stats = self.reader.stats()
+        stats["subscribers"] = self.subscriber_count()
+        stats["dropped"] = self.dropped
+        return stats
+
+    def subscriber_count(self):
+        return len([subscriber for subscriber in self.subscribers if not subscriber.dropped])
+
+    def subscribe(self):
+        # Called with fan_outs_lock held. New subscribers start at the live edge.
+        with self.condition:
+            subscriber = Subscriber(self.written)
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def leave(self, subscriber):
+        with fan_outs_lock:
+            with self.condition:
+                self.subscribers.remove(subscriber)
+                last = not self.subscribers
+            if last and fan_outs.get(self.instance) is self:
+                # The pump stops at its next chunk
+                del fan_outs[self.instance]
+        return last
+
+    def pump(self):
+        try:
+            # A dropped subscriber no longer keeps the tuner read, even before its stream is closed
+            for chunk in self.reader.chunks(lambda: self.subscriber_count() > 0):
+                self.write(chunk)
+        except Exception as err:
+            self.logger.error('Error while reading Ceton tuner %s: %s' % (self.instance, err))
+        finally:
+            self.reader.close()
+            with self.condition:
+                self.alive = False
+                self.condition.notify_all()
+
+    def write(self, chunk):
+        size = len(chunk)
+        ring_size = len(self.ring)
+        end = self.written + size
+        with self.condition:
+            for subscriber in self.subscribers:
+                if not subscriber.dropped and subscriber.cursor < end - ring_size:
+                    subscriber.dropped = True
+                    self.dropped += 1
+                    self.logger.warning('Ceton tuner %s: dropping a subscriber %s bytes behind' %
+                                        (self.instance, self.written - subscriber.cursor))
+
+        # Only data every remaining subscriber has read is overwritten, no lock needed for the copy
+        start = self.written % ring_size
+        first = min(size, ring_size - start)
+        self.view[start:start + first] = chunk[:first]
+        if first < size:
+            self.view[:size - first] = chunk[first:]
+
+        with self.condition:
+            self.written = end
+            self.condition.notify_all()
+
+    def read(self, subscriber, running):
+        ring_size = len(self.ring)
+        while running():
+            with self.condition:
+                if subscriber.dropped:
+                    return
+                if subscriber.cursor == self.written:
+                    if not self.alive:
+                        return
+                    self.condition.wait(1)
+                    continue
+                start = subscriber.cursor % ring_size
+                length = min(self.written - subscriber.cursor, ring_size - start)
+            yield self.view[start:start + length]
+            subscriber.cursor += length
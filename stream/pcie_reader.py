@@ -0,0 +1,125 @@
+import os
+import select
+import time
+
+
+class PCIe_Reader():
+    # Reads a PCIe tuner's /dev/ctn91xx_mpeg0_N node without blocking, straight into a few reused buffers,
+    # and hands the stream out as 188-byte aligned memoryviews. A chunk stays valid until `buffers` - 1 more are read.
+
+    ts_packet_size = 188
+    ts_sync = 0x47
+
+    buffers = 4
+    # Hand out what was read after this many seconds, even if the chunk is not full
+    flush_interval = 0.1
+    # The read size adapts between these, growing while reads come back full and shrinking when they do not
+    min_read = ts_packet_size * 87
+    # A stall is counted when the device gives nothing for this long
+    stall_time = 0.5
+
+    def __init__(self, filename, chunk_size, timeout):
+        self.filename = filename
+        self.chunk_size = max(chunk_size - chunk_size % self.ts_packet_size, self.min_read)
+        self.timeout = timeout
+
+        self.read_size = self.min_read
+        self.synced = False
+        self.started = None
+
+        self.bytes = 0
+        self.reads = 0
+        self.stalls = 0
+        self.resyncs = 0
+
+        self.fd = None
+
+    def open(self):
+        # Opened before the generator starts, so a missing or busy device fails the tune instead of the stream
+        self.fd = os.open(self.filename, os.O_RDONLY | os.O_NONBLOCK)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {
+                "device": self.filename,
+                "bytes": self.bytes,
+                "mbit_s": round(self.bytes * 8 / elapsed / 1000000, 2) if elapsed else 0,
+                "reads": self.reads,
+                "read_size": self.read_size,
+                "stalls": self.stalls,
+                "resyncs": self.resyncs,
+                }
+
+    def chunks(self, running):
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        pool = [bytearray(self.chunk_size + self.ts_packet_size) for _ in range(self.buffers)]
+        turn = 0
+        carry = b""
+        self.started = time.monotonic()
+        last_data = self.started
+        stalled = False
+
+        while running():
+            view = memoryview(pool[turn])
+            # The partial packet at the end of the last chunk starts this one, at most 187 bytes copied
+            fill = len(carry)
+            view[:fill] = carry
+            first = None
+            ended = False
+            while fill < self.chunk_size:
+                wait = self.stall_time if first is None else self.flush_interval - (time.monotonic() - first)
+                if wait <= 0 or not poller.poll(wait * 1000):
+                    break
+                try:
+                    size = os.readv(self.fd, [view[fill:fill + min(self.read_size, len(view) - fill)]])
+                except BlockingIOError:
+                    continue
+                if not size:
+                    ended = True
+                    break
+                self.reads += 1
+                if size == self.read_size:
+                    self.read_size = min(self.read_size * 2, self.chunk_size)
+                elif size < self.read_size // 4:
+                    self.read_size = max(self.read_size // 2, self.min_read)
+                fill += size
+                if first is None:
+                    first = time.monotonic()
+
+            start = 0
+            if not self.synced and fill:
+                start = self.sync(view, fill)
+            kept = (fill - start) - (fill - start) % self.ts_packet_size
+            carry = bytes(view[start + kept:fill])
+
+            if kept:
+                last_data = time.monotonic()
+                stalled = False
+                self.bytes += kept
+                turn = (turn + 1) % self.buffers
+                yield view[start:start + kept]
+            elif not stalled and time.monotonic() - last_data >= self.stall_time:
+                stalled = True
+                self.stalls += 1
+
+            if ended or time.monotonic() - last_data >= self.timeout:
+                return
+
+    def sync(self, view, fill):
+        # Offset of the first packet boundary, checked against the next sync byte when there is one
+        packet = self.ts_packet_size
+        offset = 0
+        while offset < fill and not (view[offset] == self.ts_sync and
+                                     (offset + packet >= fill or view[offset + packet] == self.ts_sync)):
+            offset += 1
+        if offset < fill:
+            self.synced = True
+        if offset:
+            self.resyncs += 1
+        return min(offset, fill)
@@ -0,0 +1,165 @@
+import select
+import socket
+import time
+
+
+class UDP_Receiver():
+    # Receives the MPEG-TS a network tuner sends to its port, plain UDP or RTP, and hands it out as
+    # 188-byte aligned memoryviews of a few reused buffers. A chunk stays valid until `buffers` - 1 more are read.
+
+    ts_packet_size = 188
+    ts_sync = 0x47
+    ts_null_pid = 0x1FFF
+    rtp_header_size = 12
+    max_datagram = 65536
+
+    buffers = 4
+    # Hand out what was received after this many seconds, even if the chunk is not full
+    flush_interval = 0.1
+    # Seconds between checks that the stream is still wanted while nothing arrives
+    idle_interval = 1
+    # Let datagrams queue up on the socket for this long between drains, so a wakeup reads a batch of them
+    # rather than one. The socket buffer has to hold this much of the stream.
+    batch_interval = 0.01
+
+    def __init__(self, port, chunk_size, receive_buffer, timeout):
+        self.port = port
+        self.chunk_size = max(chunk_size - chunk_size % self.ts_packet_size, self.ts_packet_size * 7)
+        self.receive_buffer = receive_buffer
+        self.timeout = timeout
+
+        self.rtp = None
+        self.started = None
+        self.rtp_header = bytearray(self.rtp_header_size)
+        self.continuity = {}
+
+        self.bytes = 0
+        self.datagrams = 0
+        self.cc_errors = 0
+        self.resyncs = 0
+
+        self.sock = None
+
+    def open(self):
+        # Bound before the generator starts, so a busy port fails the tune instead of the stream
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+        self.sock.bind(("", self.port))
+        self.sock.setblocking(False)
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {
+                "port": self.port,
+                "rtp": bool(self.rtp),
+                "bytes": self.bytes,
+                "mbit_s": round(self.bytes * 8 / elapsed / 1000000, 2) if elapsed else 0,
+                "datagrams": self.datagrams,
+                "cc_errors": self.cc_errors,
+                "resyncs": self.resyncs,
+                }
+
+    def chunks(self, running):
+        poller = select.poll()
+        poller.register(self.sock, select.POLLIN)
+        pool = [bytearray(self.chunk_size + self.max_datagram) for _ in range(self.buffers)]
+        turn = 0
+        self.started = time.monotonic()
+        last_data = self.started
+
+        while running():
+            view = memoryview(pool[turn])
+            fill = 0
+            started = None
+            while fill < self.chunk_size:
+                wait = self.idle_interval if started is None else self.flush_interval - (time.monotonic() - started)
+                if wait <= 0 or not poller.poll(wait * 1000):
+                    break
+                # Drain everything queued on the socket, one syscall per datagram and no copies
+                while fill < self.chunk_size:
+                    size = self.receive(view[fill:])
+                    if size is None:
+                        break
+                    fill += self.align(view, fill, size)
+                if started is None:
+                    started = time.monotonic()
+                time.sleep(self.batch_interval)
+
+            if fill:
+                last_data = time.monotonic()
+                self.bytes += fill
+                turn = (turn + 1) % self.buffers
+                yield view[:fill]
+            elif time.monotonic() - last_data >= self.timeout:
+                return
+
+    def receive(self, view):
+        # Returns the size of the TS payload now at the start of view, None once the socket is drained
+        try:
+            if self.rtp:
+                # The fixed RTP header lands in its own buffer, the payload straight in the chunk
+                size, ancdata, flags, address = self.sock.recvmsg_into([self.rtp_header, view[:self.max_datagram]])
+                self.datagrams += 1
+                return self.strip_rtp(view, size - self.rtp_header_size, self.rtp_header)
+
+            size = self.sock.recv_into(view[:self.max_datagram])
+        except BlockingIOError:
+            return None
+        self.datagrams += 1
+
+        if self.rtp is None:
+            # Decided on the first datagram: TS starts with the sync byte, RTP with version 2
+            self.rtp = size > self.rtp_header_size and view[0] != self.ts_sync and view[0] >> 6 == 2
+        if self.rtp:
+            header = bytes(view[:self.rtp_header_size])
+            view[:size - self.rtp_header_size] = view[self.rtp_header_size:size]
+            return self.strip_rtp(view, size - self.rtp_header_size, header)
+        return size
+
+    def strip_rtp(self, view, size, header):
+        # CSRC entries and header extensions follow the fixed header, rare enough to move the payload for
+        if size <= 0:
+            return 0
+        extra = 4 * (header[0] & 0x0F)
+        if header[0] & 0x10 and size >= extra + 4:
+            extra += 4 + 4 * ((view[extra + 2] << 8) | view[extra + 3])
+        if extra:
+            extra = min(extra, size)
+            view[:size - extra] = view[extra:size]
+        return max(0, size - extra)
+
+    def align(self, view, start, size):
+        # Keep whole TS packets only, starting on a sync byte, and count continuity counter gaps.
+        # Returns the number of bytes kept at start.
+        packet = self.ts_packet_size
+        offset = 0
+        if size % packet or (size and view[start] != self.ts_sync):
+            self.resyncs += 1
+            while offset < size and not (view[start + offset] == self.ts_sync and
+                                         (offset + packet >= size or view[start + offset + packet] == self.ts_sync)):
+                offset += 1
+        kept = (size - offset) - (size - offset) % packet
+        if offset and kept:
+            view[start:start + kept] = view[start + offset:start + offset + kept]
+
+        continuity = self.continuity
+        for position in range(start, start + kept, packet):
+            flags = view[position + 3]
+            if not flags & 0x10:
+                # No payload, the counter does not advance
+                continue
+            pid = ((view[position + 1] & 0x1F) << 8) | view[position + 2]
+            if pid == self.ts_null_pid:
+                continue
+            counter = flags & 0x0F
+            last = continuity.get(pid)
+            if last is not None and counter != (last + 1) & 0x0F and counter != last:
+                self.cc_errors += 1
+            continuity[pid] = counter
+        return kept
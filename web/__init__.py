@@ -1,6 +1,8 @@
-
 from .ceton_api import Ceton_API
 from .ceton_html import Ceton_HTML
+from .ceton_metrics import Ceton_Metrics
+from .ceton_events import Ceton_Events
+from .ceton_status import Ceton_Status
 
 
 class Plugin_OBJ():
@@ -9,5 +11,10 @@ class Plugin_OBJ():
         self.fhdhr = fhdhr
         self.plugin_utils = plugin_utils
 
+        # One poller for the Ceton page, however many are open
+        self.ceton_status = Ceton_Status(fhdhr, plugin_utils)
+
         self.ceton_api = Ceton_API(plugin_utils)
-        self.ceton_html = Ceton_HTML(fhdhr, plugin_utils)
+        self.ceton_html = Ceton_HTML(fhdhr, plugin_utils, self.ceton_status)
+        self.ceton_metrics = Ceton_Metrics(plugin_utils)
+        self.ceton_events = Ceton_Events(plugin_utils, self.ceton_status)
@@ -23,8 +23,29 @@ class Ceton_API():
             self.plugin_utils.origin_obj.startstop_ceton_tuner(tuner_number, 0)
 
         if method == "status":
-            self.plugin_utils.origin_obj.get_ceton_tuner_status(None, scan=True)
-            return self.plugin_utils.origin_obj.tunerstatus
+            # The snapshot of the tuner monitor, which is asked to refresh it
+            origin = self.plugin_utils.origin_obj
+            origin.get_ceton_tuner_status(None, scan=True)
+            # Not polled in the background, the signal readings come from the get_var cache
+            signal = {"level": "Signal_Level", "snr": "Signal_SNR", "ber": "Signal_BER"}
+            getvars = origin.get_ceton_getvars([(tuner.instance, query) for tuner in origin.ceton_tuners
+                                                for query in signal.values()])
+            status = {}
+            for tuner in origin.ceton_tuners:
+                status[str(tuner.instance)] = tuner.to_dict()
+                for key, query in signal.items():
+                    status[str(tuner.instance)][key] = getvars[(tuner.instance, query)]
+            return status
+
+        if method == "history":
+            if tuner_number is not None:
+                tuner_number = int(tuner_number)
+            return self.plugin_utils.origin_obj.tune_history.get(tuner_number)
+
+        if method == "streams":
+            # Streams read in-process by stream_method ceton
+            return {str(instance): reader.stats()
+                    for instance, reader in list(self.plugin_utils.origin_obj.stream_readers.items())}
 
         if redirect_url:
             return redirect(redirect_url)
@@ -0,0 +1,38 @@
+import json
+
+from flask import Response, request
+
+
+class Ceton_Events():
+    # Server-sent events for the Ceton page: the fields changed since the revision the client has
+    endpoints = ["/api/ceton/events"]
+    endpoint_name = "api_ceton_events"
+    endpoint_methods = ["GET"]
+
+    # Seconds between keep-alive comments, so proxies do not close an idle stream
+    keepalive = 15
+
+    def __init__(self, plugin_utils, status):
+        self.plugin_utils = plugin_utils
+        self.status = status
+
+    def __call__(self, *args):
+        return self.get(*args)
+
+    def get(self, *args):
+        # A reconnecting EventSource resumes from the id of the last event it got
+        since = request.headers.get('Last-Event-ID', None, type=int)
+        if since is None:
+            since = request.args.get('revision', 0, type=int)
+
+        def events(since):
+            while True:
+                revision, changes = self.status.wait(since, self.keepalive)
+                if changes:
+                    yield "id: %s\ndata: %s\n\n" % (revision, json.dumps(changes))
+                    since = revision
+                else:
+                    yield ": keepalive\n\n"
+
+        return Response(events(since), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,29 @@
+from flask import Response
+
+
+class Ceton_Metrics():
+    endpoints = ["/api/ceton/metrics"]
+    endpoint_name = "api_ceton_metrics"
+    endpoint_methods = ["GET"]
+
+    def __init__(self, plugin_utils):
+        self.plugin_utils = plugin_utils
+
+    def __call__(self, *args):
+        return self.get(*args)
+
+    def get(self, *args):
+        origin = self.plugin_utils.origin_obj
+
+        # Tuner gauges are read from the snapshot at scrape time
+        gauges = {}
+        for status in origin.tuner_statuses:
+            gauges[("ceton_tuners", (("status", status),))] = 0
+        for tuner in origin.ceton_tuners:
+            key = ("ceton_tuners", (("status", tuner.status),))
+            gauges[key] = gauges.get(key, 0) + 1
+            gauges[("ceton_tuner_subscribers", (("tuner", str(tuner.instance)),))] = tuner.subscribers
+        for device, transport in origin.transports.items():
+            gauges[("ceton_device_up", (("device", device),))] = int(transport.health == "Up")
+
+        return Response(origin.metrics.render(gauges), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,146 @@
+import threading
+import time
+
+
+class Ceton_Status():
+    # The device and tuner fields shown on the Ceton page, read by one shared poller for every open page.
+    # Each field records the revision it last changed in, so a client only gets what changed since its own revision.
+    # The poller runs while clients are listening, and stops `idle` seconds after the last one left.
+
+    idle = 30
+
+    device_queries = {"Temp": "Temperature", "HostHardware": "HostHardware",
+                      "HostFirmware": "HostFirmware", "HostSerial": "HostSerial"}
+    tuner_queries = {"Transport": "TransportState", "Channel": "Signal_Channel",
+                     "SignalLock": "SignalCarrierLock", "PCRLock": "SignalPCRLock", "Signal": "Signal_Level",
+                     "SNR": "Signal_SNR", "BER": "Signal_BER", "Modulation": "Signal_Modulation"}
+
+    def __init__(self, fhdhr, plugin_utils):
+        self.fhdhr = fhdhr
+        self.plugin_utils = plugin_utils
+
+        self.condition = threading.Condition()
+        self.revision = 0
+        self.values = {}
+        # (key, field) -> revision the value last changed in
+        self.changed = {}
+        self.updated = None
+        self.last_request = 0
+        self.update_lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def origin_obj(self):
+        return self.plugin_utils.origin_obj
+
+    @property
+    def interval(self):
+        return self.origin_obj.status_poll_interval
+
+    def devinuse(self, instance):
+        if not self.origin_obj.ceton_tuners[instance].ceton_pcie:
+            # Not PCIe card, so don't check device
+            return "Not PCIe Card"
+        if self.origin_obj.devinuse(instance):
+            return "In Use"
+        return "Available"
+
+    def build(self):
+        if not self.origin_obj.setup_success:
+            return {}
+
+        device_instances = self.origin_obj.device_instances
+        # The tuners of the devices, the tuners setting is the number of fHDHR streams
+        ceton_tuners = self.origin_obj.ceton_tuners
+
+        queries = [(instance, query) for instance in device_instances for query in self.device_queries.values()]
+        queries.extend((tuner.instance, query) for tuner in ceton_tuners for query in self.tuner_queries.values())
+        getvars = self.origin_obj.get_ceton_getvars(queries)
+
+        status = {}
+        for i, instance in enumerate(device_instances):
+            device = status["Device"+str(i)] = {}
+            device["Setup"] = "Success" if self.origin_obj.hwtype(instance) else "Probing"
+            device["HWType"] = self.origin_obj.hwtype(instance)
+            device["Health"] = self.origin_obj.ceton_tuners[instance].device_health
+            for key, query in self.device_queries.items():
+                device[key] = getvars[(instance, query)]
+
+        for ceton_tuner in ceton_tuners:
+            i = ceton_tuner.instance
+            tuner = status["Tuner"+str(i)] = {}
+            tuner['Device'] = ceton_tuner.device_index
+            tuner['HWState'] = self.devinuse(i)
+            for key, query in self.tuner_queries.items():
+                tuner[key] = getvars[(i, query)]
+            if tuner['HWState'] == "In Use":
+                tuner['Streaming'] = "Direct"
+            elif tuner['Transport'] == "PLAYING":
+                tuner['Streaming'] = "RTP"
+            else:
+                tuner['Streaming'] = "Idle"
+        return status
+
+    def update(self):
+        # Only one build at a time, a caller arriving during a build gets its result
+        with self.update_lock:
+            if self.updated is not None and time.monotonic() - self.updated < self.interval:
+                return
+            status = self.build()
+            with self.condition:
+                revision = self.revision + 1
+                for key, fields in status.items():
+                    values = self.values.setdefault(key, {})
+                    for field, value in fields.items():
+                        if field not in values or values[field] != value:
+                            values[field] = value
+                            self.changed[(key, field)] = revision
+                if revision in self.changed.values():
+                    self.revision = revision
+                    self.condition.notify_all()
+                self.updated = time.monotonic()
+
+    def snapshot(self):
+        # For a page load: (revision, {key: {field: value}}), fresh as of the poll interval
+        self.listen()
+        self.update()
+        with self.condition:
+            return self.revision, {key: dict(fields) for key, fields in self.values.items()}
+
+    def changes(self, since):
+        # (revision, fields changed after revision since), all of them for a client that is not up to date
+        with self.condition:
+            if since > self.revision:
+                since = 0
+            changes = {}
+            for (key, field), revision in self.changed.items():
+                if revision > since:
+                    changes.setdefault(key, {})[field] = self.values[key][field]
+            return self.revision, changes
+
+    def wait(self, since, timeout):
+        # Block until there is a revision after since, or timeout. Keeps the poller running.
+        self.listen()
+        with self.condition:
+            self.condition.wait_for(lambda: self.revision != since, timeout)
+        self.listen()
+        return self.changes(since)
+
+    def listen(self):
+        with self.condition:
+            self.last_request = time.monotonic()
+            if not self.thread:
+                self.thread = threading.Thread(target=self.run, name="ceton_status", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                if time.monotonic() - self.last_request > self.idle:
+                    self.thread = None
+                    return
+            try:
+                self.update()
+            except Exception as err:
+                self.plugin_utils.logger.error('Error while reading the Ceton status: %s' % err)
+            time.sleep(self.interval)